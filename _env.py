@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.env 加载辅助模块
+wsgi.py / app.py / test_email_config.py 各自重复解析 .env 时，
+每次调用 load_dotenv 都要重新 open+逐行解析；这里解析一次并缓存，
+后续调用只做 os.environ.update
+"""
+
+import os
+from functools import lru_cache
+
+from dotenv import dotenv_values
+
+# .env 固定取本文件同目录的绝对路径，保证 Gunicorn 等不同工作目录下也能找到
+_ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+
+@lru_cache(maxsize=1)
+def env_dict():
+    """解析 .env 并缓存结果；文件不存在时返回空字典"""
+    if not os.path.exists(_ENV_PATH):
+        return {}
+    return {k: v for k, v in dotenv_values(_ENV_PATH).items() if v is not None}
+
+
+def apply():
+    """把 .env 中的变量写入 os.environ（与原 load_dotenv(override=True) 行为一致）
+
+    返回 .env 文件路径，便于调用方打印提示。
+    """
+    os.environ.update(env_dict())
+    return _ENV_PATH
@@ -3,15 +3,96 @@ AI大模型日志整理模块
 使用免费的AI API来整理和汇总日志内容
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+import hashlib
 import json
 import os
+import random
+import re
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
 import logging
 
+try:
+    import orjson
+except ImportError:
+    # orjson未安装时回退到标准库json
+    orjson = None
+
+try:
+    # ciso8601为C实现的ISO日期解析器，比strptime快约百倍
+    from ciso8601 import parse_datetime as _parse_date
+except ImportError:
+    def _parse_date(date_str):
+        return datetime.strptime(date_str, '%Y-%m-%d')
+
 logger = logging.getLogger(__name__)
 
+# API Key在导入时读取一次（Config类体中已读过环境变量，这里只做兜底），
+# 避免每次调用都查os.environ
+_QWEN_API_KEY = os.environ.get('QWEN_API_KEY') or getattr(Config, 'QWEN_API_KEY', '')
+_WENXIN_API_KEY = os.environ.get('WENXIN_API_KEY') or getattr(Config, 'WENXIN_API_KEY', '')
+_WENXIN_SECRET_KEY = os.environ.get('WENXIN_SECRET_KEY') or getattr(Config, 'WENXIN_SECRET_KEY', '')
+
+def _json_loads(data):
+    """解析JSON（优先使用orjson，C实现、可直接处理bytes，快3-5倍）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps_bytes(obj):
+    """序列化JSON为UTF-8 bytes（优先使用orjson）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+# 可重试的HTTP状态码（限流与服务端临时错误）；4xx其余错误直接失败不重试
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+def _retry_wait_seconds(attempt, response=None):
+    """计算重试等待时间：指数退避+随机抖动，优先遵循Retry-After响应头"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), 60)
+            except ValueError:
+                pass
+    return min(2 ** attempt, 16) + random.uniform(0, 1)
+
+# API地址常量
+QWEN_API_URL = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+WENXIN_TOKEN_URL = "https://aip.baidubce.com/oauth/2.0/token"
+WENXIN_CHAT_URL = "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/eb-instant"
+HUGGINGFACE_API_URL = "https://api-inference.huggingface.co/models/Qwen/Qwen2.5-7B-Instruct"
+
+# 复用TCP+TLS连接的全局Session（避免每次调用都重新握手）
+# 重试逻辑由各call_*函数自行控制，这里不做传输层重试
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=0)))
+
+# 文心一言access_token缓存 {api_key: (access_token, 过期时间戳)}
+_wenxin_token_cache = {}
+
+# AI调用是网络IO密集型，用小线程池并发执行互不依赖的整理任务
+_AI_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ai-summarize')
+
+# AI响应缓存 {sha256(prompt): (响应文本, 时间戳)}
+# 日志未变化时重复生成报告是常见场景，命中缓存可把数秒的API调用变成字典查找
+_response_cache = {}
+_response_cache_ttl = 3600  # 缓存有效期（秒），1小时
+_response_cache_max = 512  # 缓存条目上限
+
+# 完成关键词（备用格式化路径用来判断计划/支持需求是否已完成）
+# 预编译为交替正则，对每条日志内容只做一次C层扫描，替代逐关键词的Python子串循环
+_PLAN_COMPLETION_RE = re.compile('|'.join(
+    ['已完成相关', '已完成', '已实现', '已结束', '已做完', '已搞定', '已解决', '已交付']))
+_SUPPORT_COMPLETION_RE = re.compile('|'.join(
+    ['已完成', '已实现', '已解决', '已提供', '已支持', '已交付', '已搞定', '已结束']))
+
 # 项目范围选项
 PROJECT_SCOPE_OPTIONS = [
     '导诊',
@@ -26,15 +107,42 @@ PROJECT_SCOPE_OPTIONS = [
 ]
 
 def call_free_ai_api(prompt, max_retries=3):
+    """
+    调用免费的AI大模型API（带提示词级缓存）
+
+    相同提示词在缓存有效期内直接返回上次的响应，不再请求远程API
+    """
+    cache_key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    cached = _response_cache.get(cache_key)
+    if cached:
+        result, timestamp = cached
+        if time.time() - timestamp < _response_cache_ttl:
+            logger.info(f"[AI API] 命中响应缓存，提示词长度: {len(prompt)} 字符")
+            return result
+        else:
+            # 缓存过期，删除
+            del _response_cache[cache_key]
+
+    result = _call_free_ai_api_uncached(prompt, max_retries)
+
+    # 只缓存成功的响应
+    if result:
+        _response_cache[cache_key] = (result, time.time())
+        if len(_response_cache) > _response_cache_max:
+            oldest_key = min(_response_cache.items(), key=lambda x: x[1][1])[0]
+            del _response_cache[oldest_key]
+    return result
+
+def _call_free_ai_api_uncached(prompt, max_retries=3):
     """
     调用免费的AI大模型API
-    
+
     支持的免费API：
     1. 通义千问（阿里云）- 需要API Key
     2. 文心一言（百度）- 需要API Key
     3. 本地模型（Ollama等）
     4. Hugging Face Inference API
-    
+
     优先使用配置的API，如果没有配置则使用备用方案
     """
     start_time = time.time()
@@ -42,7 +150,7 @@ def call_free_ai_api(prompt, max_retries=3):
     logger.info(f"[AI API] 开始调用AI API，提示词长度: {prompt_length} 字符，最大重试次数: {max_retries}")
     
     # 方案1：使用通义千问API（如果有配置）
-    qwen_api_key = os.environ.get('QWEN_API_KEY') or Config.QWEN_API_KEY if hasattr(Config, 'QWEN_API_KEY') else None
+    qwen_api_key = _QWEN_API_KEY
     if qwen_api_key:
         logger.info("[AI API] 使用通义千问API")
         result = call_qwen_api(prompt, qwen_api_key, max_retries)
@@ -51,8 +159,8 @@ def call_free_ai_api(prompt, max_retries=3):
         return result
     
     # 方案2：使用文心一言API（如果有配置）
-    wenxin_api_key = os.environ.get('WENXIN_API_KEY') or (Config.WENXIN_API_KEY if hasattr(Config, 'WENXIN_API_KEY') else None)
-    wenxin_secret_key = os.environ.get('WENXIN_SECRET_KEY') or (Config.WENXIN_SECRET_KEY if hasattr(Config, 'WENXIN_SECRET_KEY') else None)
+    wenxin_api_key = _WENXIN_API_KEY
+    wenxin_secret_key = _WENXIN_SECRET_KEY
     if wenxin_api_key and wenxin_secret_key:
         logger.info("[AI API] 使用文心一言API")
         result = call_wenxin_api(prompt, wenxin_api_key, wenxin_secret_key, max_retries)
@@ -69,9 +177,9 @@ def call_free_ai_api(prompt, max_retries=3):
 
 def call_qwen_api(prompt, api_key, max_retries=3):
     """调用通义千问API"""
-    url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/text-generation/generation"
+    url = QWEN_API_URL
     headers = {
-        "Authorization": f"Bearer {api_key[:10]}...",  # 只记录部分API Key用于日志
+        "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
     data = {
@@ -91,20 +199,21 @@ def call_qwen_api(prompt, api_key, max_retries=3):
     }
     
     logger.info(f"[通义千问] 请求URL: {url}")
-    logger.info(f"[通义千问] 请求参数: model=qwen-turbo, temperature=0.7, max_tokens=2000, prompt_length={len(prompt)}")
+    # 日志中只记录API Key前缀
+    logger.info(f"[通义千问] 请求参数: model=qwen-turbo, temperature=0.7, max_tokens=2000, prompt_length={len(prompt)}, key_prefix={api_key[:10]}")
     
     for attempt in range(max_retries):
         try:
             attempt_start = time.time()
             logger.info(f"[通义千问] 第 {attempt + 1}/{max_retries} 次尝试")
             
-            response = requests.post(url, headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}, json=data, timeout=30)
+            response = _SESSION.post(url, headers=headers, data=_json_dumps_bytes(data), timeout=30)
             attempt_time = time.time() - attempt_start
             
             logger.info(f"[通义千问] HTTP状态码: {response.status_code}，响应时间: {attempt_time:.2f}秒")
             
             response.raise_for_status()
-            result = response.json()
+            result = _json_loads(response.content)
             
             # 记录响应信息（不记录完整内容，只记录结构）
             if 'output' in result:
@@ -124,47 +233,62 @@ def call_qwen_api(prompt, api_key, max_retries=3):
             logger.error(f"[通义千问] 请求超时 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
             if attempt == max_retries - 1:
                 raise
+            time.sleep(_retry_wait_seconds(attempt))
         except requests.exceptions.HTTPError as e:
             logger.error(f"[通义千问] HTTP错误 (尝试 {attempt + 1}/{max_retries}): 状态码={response.status_code}, 错误={str(e)}")
-            if attempt == max_retries - 1:
+            # 仅对限流/服务端临时错误重试，其余4xx错误属于致命错误直接抛出
+            if response.status_code not in _RETRYABLE_STATUS or attempt == max_retries - 1:
                 raise
+            time.sleep(_retry_wait_seconds(attempt, response))
         except Exception as e:
             logger.error(f"[通义千问] 调用失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}: {str(e)}")
             if attempt == max_retries - 1:
                 raise
+            time.sleep(_retry_wait_seconds(attempt))
     
     return None
 
-def call_wenxin_api(prompt, api_key, secret_key, max_retries=3):
-    """调用文心一言API"""
-    # 先获取access_token
-    token_url = "https://aip.baidubce.com/oauth/2.0/token"
+def _get_wenxin_access_token(api_key, secret_key):
+    """获取文心一言access_token（带缓存，按expires_in过期后才重新请求）"""
+    cached = _wenxin_token_cache.get(api_key)
+    if cached and time.time() < cached[1]:
+        logger.info("[文心一言] 使用缓存的access_token")
+        return cached[0]
+
     token_params = {
         "grant_type": "client_credentials",
         "client_id": api_key,
         "client_secret": secret_key
     }
-    
+
     logger.info("[文心一言] 开始获取access_token")
     try:
         token_start = time.time()
-        token_response = requests.post(token_url, params=token_params, timeout=10)
+        token_response = _SESSION.post(WENXIN_TOKEN_URL, params=token_params, timeout=10)
         token_time = time.time() - token_start
         logger.info(f"[文心一言] access_token获取完成，耗时: {token_time:.2f}秒，状态码: {token_response.status_code}")
-        
+
         token_response.raise_for_status()
-        token_result = token_response.json()
+        token_result = _json_loads(token_response.content)
         access_token = token_result.get('access_token')
         if not access_token:
             logger.error("[文心一言] access_token为空")
             raise Exception('无法获取access_token')
         logger.info(f"[文心一言] access_token获取成功，长度: {len(access_token)}")
+        # 提前60秒过期，避免边界时刻使用失效token
+        expires_in = token_result.get('expires_in') or 2592000
+        _wenxin_token_cache[api_key] = (access_token, time.time() + expires_in - 60)
+        return access_token
     except Exception as e:
         logger.error(f'[文心一言] 获取access_token失败: {type(e).__name__}: {str(e)}')
         raise
-    
-    # 调用API
-    url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/eb-instant?access_token={access_token[:20]}..."
+
+def call_wenxin_api(prompt, api_key, secret_key, max_retries=3):
+    """调用文心一言API"""
+    access_token = _get_wenxin_access_token(api_key, secret_key)
+
+    # 调用API（日志中不输出access_token）
+    url = f"{WENXIN_CHAT_URL}?access_token={access_token}"
     data = {
         "messages": [
             {
@@ -184,13 +308,13 @@ def call_wenxin_api(prompt, api_key, secret_key, max_retries=3):
             attempt_start = time.time()
             logger.info(f"[文心一言] 第 {attempt + 1}/{max_retries} 次尝试")
             
-            response = requests.post(f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/eb-instant?access_token={access_token}", json=data, timeout=30)
+            response = _SESSION.post(url, headers={"Content-Type": "application/json"}, data=_json_dumps_bytes(data), timeout=30)
             attempt_time = time.time() - attempt_start
             
             logger.info(f"[文心一言] HTTP状态码: {response.status_code}，响应时间: {attempt_time:.2f}秒")
             
             response.raise_for_status()
-            result = response.json()
+            result = _json_loads(response.content)
             
             response_text = result.get('result', '')
             logger.info(f"[文心一言] 响应成功，返回内容长度: {len(response_text)} 字符")
@@ -200,14 +324,18 @@ def call_wenxin_api(prompt, api_key, secret_key, max_retries=3):
             logger.error(f"[文心一言] 请求超时 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
             if attempt == max_retries - 1:
                 raise
+            time.sleep(_retry_wait_seconds(attempt))
         except requests.exceptions.HTTPError as e:
             logger.error(f"[文心一言] HTTP错误 (尝试 {attempt + 1}/{max_retries}): 状态码={response.status_code}, 错误={str(e)}")
-            if attempt == max_retries - 1:
+            # 仅对限流/服务端临时错误重试，其余4xx错误属于致命错误直接抛出
+            if response.status_code not in _RETRYABLE_STATUS or attempt == max_retries - 1:
                 raise
+            time.sleep(_retry_wait_seconds(attempt, response))
         except Exception as e:
             logger.error(f"[文心一言] 调用失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}: {str(e)}")
             if attempt == max_retries - 1:
                 raise
+            time.sleep(_retry_wait_seconds(attempt))
     
     return None
 
@@ -216,7 +344,7 @@ def call_huggingface_api(prompt, max_retries=3):
     调用Hugging Face Inference API（免费，使用开源模型）
     使用Qwen2.5-7B-Instruct模型
     """
-    url = "https://api-inference.huggingface.co/models/Qwen/Qwen2.5-7B-Instruct"
+    url = HUGGINGFACE_API_URL
     headers = {
         "Content-Type": "application/json"
     }
@@ -237,13 +365,13 @@ def call_huggingface_api(prompt, max_retries=3):
             attempt_start = time.time()
             logger.info(f"[Hugging Face] 第 {attempt + 1}/{max_retries} 次尝试")
             
-            response = requests.post(url, headers=headers, json=data, timeout=60)
+            response = _SESSION.post(url, headers=headers, data=_json_dumps_bytes(data), timeout=60)
             attempt_time = time.time() - attempt_start
             
             logger.info(f"[Hugging Face] HTTP状态码: {response.status_code}，响应时间: {attempt_time:.2f}秒")
             
             response.raise_for_status()
-            result = response.json()
+            result = _json_loads(response.content)
             
             # Hugging Face返回格式可能是列表或字典
             response_text = None
@@ -272,17 +400,45 @@ def call_huggingface_api(prompt, max_retries=3):
                 # 如果API失败，返回简单的格式化结果
                 logger.error("[Hugging Face] 所有重试均失败，返回None")
                 return None
+            time.sleep(_retry_wait_seconds(attempt))
         except requests.exceptions.HTTPError as e:
             logger.error(f'[Hugging Face] HTTP错误 (尝试 {attempt + 1}/{max_retries}): 状态码={response.status_code}, 错误={str(e)}')
-            if attempt == max_retries - 1:
+            # 仅对限流/服务端临时错误重试，其余4xx错误属于致命错误直接放弃
+            if response.status_code not in _RETRYABLE_STATUS or attempt == max_retries - 1:
                 return None
+            time.sleep(_retry_wait_seconds(attempt, response))
         except Exception as e:
             logger.error(f'[Hugging Face] 调用失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}: {str(e)}')
             if attempt == max_retries - 1:
                 return None
+            time.sleep(_retry_wait_seconds(attempt))
     
     return None
 
+def _extract_json_array(text):
+    """
+    从AI响应文本中提取第一个JSON数组
+
+    使用json.JSONDecoder.raw_decode从'['处单遍解析，替代贪婪正则
+    r'\\[.*\\]'（后者在长响应、模型输出杂散中括号时会大量回溯）
+
+    Returns:
+        解析出的列表，失败返回None
+    """
+    if not text:
+        return None
+    decoder = json.JSONDecoder()
+    idx = text.find('[')
+    while idx != -1:
+        try:
+            obj, _ = decoder.raw_decode(text, idx)
+            if isinstance(obj, list):
+                return obj
+        except json.JSONDecodeError:
+            pass
+        idx = text.find('[', idx + 1)
+    return None
+
 def summarize_weekly_logs(logs, project_scope=None):
     """
     使用AI整理本周工作总结
@@ -297,10 +453,11 @@ def summarize_weekly_logs(logs, project_scope=None):
     if not logs:
         return []
     
-    # 构建提示词
-    logs_text = ""
+    # 构建提示词（list+join避免字符串+=的O(n²)重复拷贝）
+    logs_parts = []
     for i, log in enumerate(logs, 1):
-        logs_text += f"{i}. 日期：{log.get('date', '')}，分类：{log.get('category', '')}，内容：{log.get('content', '')}\n"
+        logs_parts.append(f"{i}. 日期：{log.get('date', '')}，分类：{log.get('category', '')}，内容：{log.get('content', '')}\n")
+    logs_text = "".join(logs_parts)
     
     prompt = f"""请根据以下一周的工作日志，整理成本周工作总结表格。要求：
 1. 将相似的工作内容合并
@@ -326,22 +483,12 @@ def summarize_weekly_logs(logs, project_scope=None):
         
         if ai_response:
             logger.info(f"[工作总结整理] AI响应成功，响应长度: {len(ai_response)} 字符")
-            # 尝试解析JSON
-            # 清理响应文本，提取JSON部分
-            import re
-            json_match = re.search(r'\[.*\]', ai_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    result = json.loads(json_str)
-                    logger.info(f"[工作总结整理] JSON解析成功，整理后条目数: {len(result)}")
-                    return result
-                except json.JSONDecodeError as e:
-                    logger.error(f"[工作总结整理] JSON解析失败: {str(e)}，使用简单格式化")
-                    return format_logs_simple(logs)
+            result = _extract_json_array(ai_response)
+            if result is not None:
+                logger.info(f"[工作总结整理] JSON解析成功，整理后条目数: {len(result)}")
+                return result
             else:
-                logger.warning("[工作总结整理] 响应中未找到JSON格式，使用简单格式化")
-                # 如果无法解析JSON，使用简单格式化
+                logger.warning("[工作总结整理] 响应中未解析到JSON数组，使用简单格式化")
                 return format_logs_simple(logs)
         else:
             logger.warning("[工作总结整理] AI调用返回空响应，使用简单格式化")
@@ -364,46 +511,54 @@ def summarize_next_week_plans(logs, next_week_start, next_week_end):
     Returns:
         整理后的工作计划列表，格式：[{'序号': 1, '工作描述': '...', '预计开始时间': '...', '计划截至': '...', '备注': '...'}, ...]
     """
-    # 收集所有下一步计划及其相关信息（包括日期、工作内容、分类和后续日志内容）
-    plans_with_info = []
+    # 日期/内容只投影一次，后续日志通过下标引用同一列表，避免为每个计划复制O(N)的字典列表
+    log_contents = [{'date': log.get('date', ''), 'content': log.get('content', '')} for log in logs]
+
+    # 收集所有下一步计划及其相关信息（包括日期、工作内容、分类和后续日志的起始下标）
+    # 同一计划连续几天重复填写很常见，先按归一化文本在本地合并，
+    # 只把代表条目送入LLM，直接减少输入token量和时延
+    merged_plans = {}
     for i, log in enumerate(logs):
         if log.get('next_plan') and log.get('next_plan').strip() and log.get('next_plan').strip() != '无':
             plan_text = log.get('next_plan').strip()
-            plan_date = log.get('date', '')
-            category = log.get('category', '')
-            content = log.get('content', '')
-            # 收集该计划出现后的所有日志内容，用于判断是否已完成
-            subsequent_contents = []
-            for j in range(i + 1, len(logs)):
-                subsequent_contents.append({
-                    'date': logs[j].get('date', ''),
-                    'content': logs[j].get('content', '')
-                })
-            plans_with_info.append({
-                'plan': plan_text,
-                'date': plan_date,
-                'category': category,
-                'content': content,
-                'subsequent_contents': subsequent_contents
-            })
-    
+            plan_key = ' '.join(plan_text.split())
+            entry = merged_plans.get(plan_key)
+            if entry is None:
+                merged_plans[plan_key] = {
+                    'plan': plan_text,
+                    'date': log.get('date', ''),
+                    'dates': [log.get('date', '')],
+                    'category': log.get('category', ''),
+                    'content': log.get('content', ''),
+                    'subsequent_start': i + 1
+                }
+            else:
+                # 重复出现只记录日期，沿用首次出现的上下文和后续日志窗口
+                entry['dates'].append(log.get('date', ''))
+    plans_with_info = list(merged_plans.values())
+
     if not plans_with_info:
         return []
     
     # 构建包含日志内容的提示词，让AI判断哪些计划已完成并估算截至日期
-    plans_text = ""
-    logs_text = ""
+    # （list+join避免字符串+=的O(n²)重复拷贝）
+    plans_parts = []
+    logs_parts = []
     for i, plan_info in enumerate(plans_with_info):
-        plans_text += f"{i+1}. 【计划内容】{plan_info['plan']}\n"
-        plans_text += f"   【计划日期】{plan_info['date']}\n"
-        plans_text += f"   【工作分类】{plan_info['category']}\n"
+        plans_parts.append(f"{i+1}. 【计划内容】{plan_info['plan']}\n")
+        plans_parts.append(f"   【计划日期】{'、'.join(plan_info['dates'])}\n")
+        plans_parts.append(f"   【工作分类】{plan_info['category']}\n")
         if plan_info['content']:
-            plans_text += f"   【相关工作内容】{plan_info['content']}\n"
-        plans_text += "\n"
-        if plan_info['subsequent_contents']:
-            logs_text += f"\n计划{i+1}的后续日志内容：\n"
-            for content_info in plan_info['subsequent_contents']:
-                logs_text += f"  - {content_info['date']}: {content_info['content']}\n"
+            # 截断过长的工作内容，控制提示词token量
+            plans_parts.append(f"   【相关工作内容】{plan_info['content'][:200]}\n")
+        plans_parts.append("\n")
+        subsequent_contents = log_contents[plan_info['subsequent_start']:]
+        if subsequent_contents:
+            logs_parts.append(f"\n计划{i+1}的后续日志内容：\n")
+            for content_info in subsequent_contents:
+                logs_parts.append(f"  - {content_info['date']}: {content_info['content']}\n")
+    plans_text = "".join(plans_parts)
+    logs_text = "".join(logs_parts)
     
     prompt = f"""请根据以下下一步计划、工作内容和后续日志，整理成下周工作计划表格。要求：
 1. 仔细检查每个计划的后续日志内容，如果日志中明确提到该计划已完成、已实现、已结束、已完成相关任务等，则不要将该计划放入下周计划中
@@ -435,64 +590,51 @@ def summarize_next_week_plans(logs, next_week_start, next_week_end):
         
         if ai_response:
             logger.info(f"[工作计划整理] AI响应成功，响应长度: {len(ai_response)} 字符")
-            # 尝试解析JSON
-            import re
-            json_match = re.search(r'\[.*\]', ai_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    result = json.loads(json_str)
-                    logger.info(f"[工作计划整理] JSON解析成功，整理后条目数: {len(result)}")
-                    return result
-                except json.JSONDecodeError as e:
-                    logger.error(f"[工作计划整理] JSON解析失败: {str(e)}，使用简单格式化")
-                    return format_plans_simple(plans_with_info, next_week_start)
+            result = _extract_json_array(ai_response)
+            if result is not None:
+                logger.info(f"[工作计划整理] JSON解析成功，整理后条目数: {len(result)}")
+                return result
             else:
-                logger.warning("[工作计划整理] 响应中未找到JSON格式，使用简单格式化")
-                # 如果无法解析JSON，使用简单格式化
-                return format_plans_simple(plans_with_info, next_week_start)
+                logger.warning("[工作计划整理] 响应中未解析到JSON数组，使用简单格式化")
+                return format_plans_simple(plans_with_info, next_week_start, log_contents)
         else:
             logger.warning("[工作计划整理] AI调用返回空响应，使用简单格式化")
             # AI调用失败，使用简单格式化
-            return format_plans_simple(plans_with_info, next_week_start)
+            return format_plans_simple(plans_with_info, next_week_start, log_contents)
     except Exception as e:
         logger.error(f'[工作计划整理] AI整理工作计划失败: {type(e).__name__}: {str(e)}', exc_info=True)
         # 失败时使用简单格式化
-        return format_plans_simple(plans_with_info, next_week_start)
+        return format_plans_simple(plans_with_info, next_week_start, log_contents)
 
 def format_logs_simple(logs):
     """简单格式化日志（AI失败时的备用方案）"""
     result = []
-    seen_descriptions = set()
+    seen = set()
     
-    for i, log in enumerate(logs, 1):
+    for log in logs:
         category = log.get('category', '')
         content = log.get('content', '')
-        # 简化描述
-        description = f"【{category}】{content[:50]}{'...' if len(content) > 50 else ''}"
-        
-        # 去重
-        if description not in seen_descriptions:
-            result.append({
-                '序号': len(result) + 1,
-                '工作描述': description,
-                '状态': '已完成',
-                '备注': content[:100] if len(content) > 100 else content
-            })
-            seen_descriptions.add(description)
+        short = content[:50]
+        # 先用(分类, 内容前缀)去重，重复项不再构建描述字符串
+        key = (category, short)
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append({
+            '序号': len(result) + 1,
+            '工作描述': f"【{category}】{short}{'...' if len(content) > 50 else ''}",
+            '状态': '已完成',
+            # 切片长度不超过原串时直接返回原串，无需再判断长度
+            '备注': content[:100]
+        })
     
     return result
 
-def format_plans_simple(plans_with_info, start_date):
+def format_plans_simple(plans_with_info, start_date, log_contents=None):
     """简单格式化计划（AI失败时的备用方案），过滤已完成的计划，智能估算截至日期"""
-    from datetime import datetime, timedelta
-    
     result = []
     seen_plans = set()
-    
-    # 完成关键词列表
-    completion_keywords = ['已完成', '已实现', '已结束', '已完成相关', '已做完', '已搞定', '已解决', '已交付']
-    
+
     # 根据工作分类估算天数的规则
     def estimate_days(plan_text, category):
         """根据计划内容和分类估算所需天数"""
@@ -518,28 +660,24 @@ def format_plans_simple(plans_with_info, start_date):
         return 3
     
     try:
-        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
+        start_date_obj = _parse_date(start_date)
     except:
         # 如果日期格式错误，使用当前日期
         start_date_obj = datetime.now()
     
+    log_contents = log_contents or []
     for plan_info in plans_with_info:
         plan = plan_info['plan']
         if plan not in seen_plans:
+            # 提取计划的前几个关键词，只计算一次
+            plan_keywords = [word for word in plan.split() if len(word) > 2][:3]
             # 检查后续日志内容，判断计划是否已完成
             is_completed = False
-            for content_info in plan_info['subsequent_contents']:
+            for content_info in log_contents[plan_info['subsequent_start']:]:
                 content = content_info['content']
-                # 检查日志内容中是否包含完成关键词，并且提到了该计划
-                for keyword in completion_keywords:
-                    if keyword in content:
-                        # 简单匹配：如果日志内容中包含计划的关键词，认为可能已完成
-                        # 提取计划的前几个关键词进行匹配
-                        plan_keywords = [word for word in plan.split() if len(word) > 2][:3]
-                        if any(keyword in content for keyword in plan_keywords):
-                            is_completed = True
-                            break
-                if is_completed:
+                # 日志内容中同时出现完成关键词和计划关键词，认为可能已完成
+                if _PLAN_COMPLETION_RE.search(content) and any(kw in content for kw in plan_keywords):
+                    is_completed = True
                     break
             
             # 只添加未完成的计划
@@ -573,8 +711,7 @@ def summarize_support_requirements(logs, next_week_start, next_week_end):
     Returns:
         整理后的支持需求列表，格式：[{'序号': 1, '内容': '...', '支持方': '...', '时间要求': '...'}, ...]
     """
-    # 收集所有支持需求及其相关信息（包括日期和后续日志内容）
-    support_requirements = []
+    # 收集所有支持需求及其相关信息（包括日期和后续日志的起始下标）
     support_types = {
         'need_product_support': '产品支持',
         'need_dev_support': '研发支持',
@@ -583,45 +720,56 @@ def summarize_support_requirements(logs, next_week_start, next_week_end):
         'need_customer_support': '客户支持'
     }
     
+    # 日期/内容只投影一次，后续日志通过下标引用同一列表，避免为每条支持需求复制O(N)的字典列表
+    log_contents = [{'date': log.get('date', ''), 'content': log.get('content', '')} for log in logs]
+
+    # 同一支持需求跨天重复填写时在本地合并，只把代表条目送入LLM
+    merged_supports = {}
     for i, log in enumerate(logs):
         for support_field, support_name in support_types.items():
             support_content = log.get(support_field, '')
             if support_content and support_content.strip() and support_content.strip() != '无':
-                # 收集该支持需求出现后的所有日志内容，用于判断是否已完成
-                subsequent_contents = []
-                for j in range(i + 1, len(logs)):
-                    subsequent_contents.append({
-                        'date': logs[j].get('date', ''),
-                        'content': logs[j].get('content', '')
-                    })
-                support_requirements.append({
-                    'date': log.get('date', ''),
-                    'category': log.get('category', ''),
-                    'content': log.get('content', ''),
-                    'next_plan': log.get('next_plan', ''),
-                    'support_type': support_name,
-                    'support_content': support_content.strip(),
-                    'subsequent_contents': subsequent_contents
-                })
-    
+                support_text_clean = support_content.strip()
+                support_key = (support_name, ' '.join(support_text_clean.split()))
+                entry = merged_supports.get(support_key)
+                if entry is None:
+                    merged_supports[support_key] = {
+                        'date': log.get('date', ''),
+                        'dates': [log.get('date', '')],
+                        'category': log.get('category', ''),
+                        'content': log.get('content', ''),
+                        'next_plan': log.get('next_plan', ''),
+                        'support_type': support_name,
+                        'support_content': support_text_clean,
+                        'subsequent_start': i + 1
+                    }
+                else:
+                    entry['dates'].append(log.get('date', ''))
+    support_requirements = list(merged_supports.values())
+
     if not support_requirements:
         return []
     
     # 构建包含后续日志内容的提示词，让AI判断哪些支持需求已完成
-    support_text = ""
-    logs_text = ""
+    # （list+join避免字符串+=的O(n²)重复拷贝）
+    support_parts = []
+    logs_parts = []
     for i, req in enumerate(support_requirements, 1):
-        support_text += f"{i}. 【{req['support_type']}】\n"
-        support_text += f"   日期：{req['date']}\n"
-        support_text += f"   分类：{req['category']}\n"
-        support_text += f"   工作内容：{req['content']}\n"
+        support_parts.append(f"{i}. 【{req['support_type']}】\n")
+        support_parts.append(f"   日期：{'、'.join(req['dates'])}\n")
+        support_parts.append(f"   分类：{req['category']}\n")
+        # 截断过长的工作内容，控制提示词token量
+        support_parts.append(f"   工作内容：{req['content'][:200]}\n")
         if req['next_plan']:
-            support_text += f"   下一步计划：{req['next_plan']}\n"
-        support_text += f"   支持需求：{req['support_content']}\n\n"
-        if req['subsequent_contents']:
-            logs_text += f"\n支持需求{i}的后续日志内容：\n"
-            for content_info in req['subsequent_contents']:
-                logs_text += f"  - {content_info['date']}: {content_info['content']}\n"
+            support_parts.append(f"   下一步计划：{req['next_plan']}\n")
+        support_parts.append(f"   支持需求：{req['support_content']}\n\n")
+        subsequent_contents = log_contents[req['subsequent_start']:]
+        if subsequent_contents:
+            logs_parts.append(f"\n支持需求{i}的后续日志内容：\n")
+            for content_info in subsequent_contents:
+                logs_parts.append(f"  - {content_info['date']}: {content_info['content']}\n")
+    support_text = "".join(support_parts)
+    logs_text = "".join(logs_parts)
     
     prompt = f"""请根据以下支持需求信息和后续日志内容，整理成支持需求表格。要求：
 1. 仔细检查每个支持需求的后续日志内容，如果日志中明确提到该支持需求已完成、已实现、已解决、已提供支持等，则不要将该支持需求放入表格中
@@ -648,54 +796,64 @@ def summarize_support_requirements(logs, next_week_start, next_week_end):
         
         if ai_response:
             logger.info(f"[支持需求整理] AI响应成功，响应长度: {len(ai_response)} 字符")
-            # 尝试解析JSON
-            import re
-            json_match = re.search(r'\[.*\]', ai_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                try:
-                    result = json.loads(json_str)
-                    logger.info(f"[支持需求整理] JSON解析成功，整理后条目数: {len(result)}")
-                    return result
-                except json.JSONDecodeError as e:
-                    logger.error(f"[支持需求整理] JSON解析失败: {str(e)}，使用简单格式化")
-                    return format_support_simple(support_requirements, next_week_start)
+            result = _extract_json_array(ai_response)
+            if result is not None:
+                logger.info(f"[支持需求整理] JSON解析成功，整理后条目数: {len(result)}")
+                return result
             else:
-                logger.warning("[支持需求整理] 响应中未找到JSON格式，使用简单格式化")
-                return format_support_simple(support_requirements, next_week_start)
+                logger.warning("[支持需求整理] 响应中未解析到JSON数组，使用简单格式化")
+                return format_support_simple(support_requirements, next_week_start, log_contents)
         else:
             logger.warning("[支持需求整理] AI调用返回空响应，使用简单格式化")
-            return format_support_simple(support_requirements, next_week_start)
+            return format_support_simple(support_requirements, next_week_start, log_contents)
     except Exception as e:
         logger.error(f'[支持需求整理] AI整理支持需求失败: {type(e).__name__}: {str(e)}', exc_info=True)
-        return format_support_simple(support_requirements, next_week_start)
+        return format_support_simple(support_requirements, next_week_start, log_contents)
+
+def summarize_report_sections_concurrently(logs_for_summary, project_scope,
+                                           logs_for_plans, logs_for_support,
+                                           next_week_start, next_week_end):
+    """
+    并发执行三个AI整理任务（本周总结、下周计划、支持需求）
 
-def format_support_simple(support_requirements, start_date):
+    三个任务互不依赖且都阻塞在远程API上，并发执行可将总耗时
+    从三次调用之和降为最慢一次调用的耗时
+
+    Returns:
+        (weekly_summary, next_week_plans, support_requirements) 三元组
+    """
+    start_time = time.time()
+    logger.info("[AI并发整理] 开始并发执行三个整理任务")
+    summary_future = _AI_EXECUTOR.submit(summarize_weekly_logs, logs_for_summary, project_scope)
+    plans_future = _AI_EXECUTOR.submit(summarize_next_week_plans, logs_for_plans, next_week_start, next_week_end)
+    support_future = _AI_EXECUTOR.submit(summarize_support_requirements, logs_for_support, next_week_start, next_week_end)
+
+    weekly_summary = summary_future.result()
+    next_week_plans = plans_future.result()
+    support_requirements = support_future.result()
+    elapsed_time = time.time() - start_time
+    logger.info(f"[AI并发整理] 三个整理任务全部完成，总耗时: {elapsed_time:.2f}秒")
+    return weekly_summary, next_week_plans, support_requirements
+
+def format_support_simple(support_requirements, start_date, log_contents=None):
     """简单格式化支持需求（AI失败时的备用方案），过滤已完成的支持需求"""
     result = []
     seen_supports = set()
-    
-    # 完成关键词列表
-    completion_keywords = ['已完成', '已实现', '已解决', '已提供', '已支持', '已交付', '已搞定', '已结束']
-    
+
+    log_contents = log_contents or []
     for req in support_requirements:
         # 使用支持类型和内容作为唯一标识
         support_key = f"{req['support_type']}:{req['support_content']}"
         if support_key not in seen_supports:
+            # 提取支持内容的前几个关键词，只计算一次
+            support_keywords = [word for word in req['support_content'].split() if len(word) > 2][:3]
             # 检查后续日志内容，判断支持需求是否已完成
             is_completed = False
-            for content_info in req.get('subsequent_contents', []):
+            for content_info in log_contents[req['subsequent_start']:]:
                 content = content_info.get('content', '')
-                # 检查日志内容中是否包含完成关键词，并且提到了该支持需求
-                for keyword in completion_keywords:
-                    if keyword in content:
-                        # 简单匹配：如果日志内容中包含支持需求的关键词，认为可能已完成
-                        # 提取支持内容的前几个关键词进行匹配
-                        support_keywords = [word for word in req['support_content'].split() if len(word) > 2][:3]
-                        if any(keyword in content for keyword in support_keywords):
-                            is_completed = True
-                            break
-                if is_completed:
+                # 日志内容中同时出现完成关键词和支持需求关键词，认为可能已完成
+                if _SUPPORT_COMPLETION_RE.search(content) and any(kw in content for kw in support_keywords):
+                    is_completed = True
                     break
             
             # 只添加未完成的支持需求
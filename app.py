@@ -1,17 +1,23 @@
+# 加载.env文件中的环境变量（_env模块内缓存解析结果，wsgi.py已加载时不再重读文件）。
+# 必须放在其他业务模块导入之前：config/ai_summarizer等在导入时读取os.environ
+from _env import apply as _apply_env
+_apply_env()
+
 from flask import Flask
+from flask.json.provider import JSONProvider
 from flask_login import LoginManager
 from config import Config
 from models import db, User
 from routes import register_routes
 from scheduler import init_scheduler
-from dotenv import load_dotenv
 import os
 import logging
 
-# 加载.env文件中的环境变量
-# 使用绝对路径和强制覆盖，确保 Gunicorn 运行时也能找到 .env 文件
-env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-load_dotenv(env_path, override=True)
+try:
+    import orjson
+except ImportError:
+    # orjson未安装时继续使用Flask默认的JSON序列化
+    orjson = None
 
 # 配置日志
 logging.basicConfig(
@@ -20,11 +26,25 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+class OrjsonProvider(JSONProvider):
+    """基于orjson的JSON序列化，get_logs等返回大列表的接口序列化快数倍"""
+
+    def dumps(self, obj, **kwargs):
+        # orjson原生支持date/datetime；返回str与Flask接口保持一致
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 def create_app():
     """创建Flask应用"""
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    # 使用orjson加速所有jsonify响应（未安装时保持默认）
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    
     # 初始化数据库
     db.init_app(app)
     
@@ -50,10 +70,23 @@ def create_app():
     os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(Config.TEMPLATE_UPLOAD_FOLDER, exist_ok=True)
     
-    # 创建数据库表
+    # 注册初始化命令：flask init-db（部署时执行一次）
+    @app.cli.command('init-db')
+    def init_db_command():
+        """创建数据库表并初始化基础数据"""
+        init_db(app)
+
+    # 默认在启动时初始化数据库（兼容原有部署方式）；
+    # 多worker部署下设置SKIP_DB_INIT=1跳过，改为部署时执行一次 flask init-db
+    if os.environ.get('SKIP_DB_INIT') != '1':
+        init_db(app)
+    
+    return app
+
+def init_db(app):
+    """创建数据库表并初始化任务分类数据"""
     with app.app_context():
         db.create_all()
-        # 初始化任务分类数据
         from models import TaskCategory
         if TaskCategory.query.count() == 0:
             categories = [
@@ -69,12 +102,9 @@ def create_app():
                 {'name': '上线及培训', 'order': 10},
                 {'name': '其他', 'order': 11}
             ]
-            for cat in categories:
-                task_cat = TaskCategory(name=cat['name'], order=cat['order'])
-                db.session.add(task_cat)
+            # 批量插入，单条INSERT代替逐条add
+            db.session.bulk_insert_mappings(TaskCategory, categories)
             db.session.commit()
-    
-    return app
 
 # 创建应用实例（供 Gunicorn 使用）
 app = create_app()
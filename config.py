@@ -14,6 +14,19 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 连接池配置：避免每个请求都重新建立MySQL连接
+    # pool_recycle小于MySQL默认wait_timeout(8小时)，防止取到已被服务端断开的连接
+    # 各项可通过环境变量按部署规模调整（如多worker时调小pool_size避免占满MySQL连接数）
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', '20')),
+        'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', '1800')),
+        # 默认关闭逐次checkout的SELECT 1探活：wsgi.py启动时已整体预热连接池，
+        # 过期连接交给pool_recycle处理；需要时可用环境变量重新打开
+        'pool_pre_ping': os.environ.get('SQLALCHEMY_POOL_PRE_PING', 'false').lower() == 'true',
+        # SQLAlchemy默认编译缓存500条；路由数量多且IN条件用expanding参数时适当调大
+        'query_cache_size': 1200,
+    }
     
     # 周报生成配置
     REPORT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'reports')
@@ -21,11 +34,11 @@ class Config:
     
     # Logo上传配置
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'logos')
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
     
     # 模板文件上传配置
     TEMPLATE_UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'templates')
-    ALLOWED_TEMPLATE_EXTENSIONS = {'docx', 'doc'}
+    ALLOWED_TEMPLATE_EXTENSIONS = frozenset({'docx', 'doc'})
     
     # 大模型API配置（预留，暂不启用）
     LLM_API_KEY = os.environ.get('LLM_API_KEY') or ''
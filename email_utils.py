@@ -1,4 +1,7 @@
+import io
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
@@ -9,6 +12,56 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# QQ邮箱普通附件上限约50MB，留出base64编码后约1/3的膨胀空间
+_MAX_ATTACHMENT_SIZE = 35 * 1024 * 1024
+
+# 复用SMTP连接，避免每封邮件都重复TCP握手+TLS+登录
+# （定时任务批量发送时连接建立开销远大于邮件本身的传输开销）
+_smtp_connection = None
+_smtp_lock = threading.Lock()
+_smtp_last_used = 0
+_smtp_idle_timeout = 60  # 空闲超过60秒后重建连接，避免被服务端断开后才发现
+
+def _connect_smtp():
+    """建立新的SMTP连接并登录"""
+    if Config.MAIL_USE_SSL:
+        server = smtplib.SMTP_SSL(Config.MAIL_HOST, Config.MAIL_PORT)
+    else:
+        server = smtplib.SMTP(Config.MAIL_HOST, Config.MAIL_PORT)
+        server.starttls()
+    server.login(Config.MAIL_USERNAME, Config.MAIL_PASSWORD)
+    return server
+
+def _get_smtp_connection():
+    """获取可用的SMTP连接（需在持有_smtp_lock时调用）
+
+    复用已有连接；空闲过久或NOOP探活失败时重建。
+    """
+    global _smtp_connection
+    if _smtp_connection is not None:
+        if time.time() - _smtp_last_used < _smtp_idle_timeout:
+            return _smtp_connection
+        # 空闲较久，先探活
+        try:
+            status = _smtp_connection.noop()[0]
+            if status == 250:
+                return _smtp_connection
+        except Exception:
+            pass
+        _close_smtp_connection()
+    _smtp_connection = _connect_smtp()
+    return _smtp_connection
+
+def _close_smtp_connection():
+    """关闭并丢弃缓存的SMTP连接"""
+    global _smtp_connection
+    if _smtp_connection is not None:
+        try:
+            _smtp_connection.quit()
+        except Exception:
+            pass
+        _smtp_connection = None
+
 def send_email(to_email: str, subject: str, body: str, attachments: Optional[List[str]] = None) -> bool:
     """发送邮件"""
     if not to_email:
@@ -26,93 +79,115 @@ def send_email(to_email: str, subject: str, body: str, attachments: Optional[Lis
 
     msg.attach(MIMEText(body, 'plain', 'utf-8'))
 
+    attachment_count = 0
     for path in attachments or []:
         try:
             if not os.path.exists(path):
-                logger.warning(f'[邮件] 附件不存在: {path}')
+                logger.warning('[邮件] 附件不存在: %s', path)
+                continue
+            size = os.path.getsize(path)
+            if size > _MAX_ATTACHMENT_SIZE:
+                logger.warning('[邮件] 附件超过大小限制（%d字节），跳过: %s', size, path)
                 continue
             with open(path, 'rb') as f:
                 part = MIMEApplication(f.read())
                 part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
                 msg.attach(part)
+                attachment_count += 1
         except Exception as e:
-            logger.exception(f'[邮件] 附件添加失败: {path}, {e}')
+            logger.exception('[邮件] 附件添加失败: %s', path)
 
-    try:
-        if Config.MAIL_USE_SSL:
-            server = smtplib.SMTP_SSL(Config.MAIL_HOST, Config.MAIL_PORT)
-        else:
-            server = smtplib.SMTP(Config.MAIL_HOST, Config.MAIL_PORT)
-            server.starttls()
-        server.login(Config.MAIL_USERNAME, Config.MAIL_PASSWORD)
-        server.sendmail(msg['From'], [to_email], msg.as_string())
-        server.quit()
-        logger.info(f'[邮件] 已发送至 {to_email}，主题: {subject}，附件数: {len(attachments or [])}')
-        return True
-    except Exception as e:
-        logger.exception(f'[邮件] 发送失败: {e}')
+    global _smtp_last_used
+    with _smtp_lock:
+        # 复用的连接可能在空闲窗口内被服务端悄悄断开（QQ邮箱常见），
+        # 首次失败时丢弃旧连接换新连接重试一次，不让定时邮件因此丢失
+        for attempt in (1, 2):
+            try:
+                server = _get_smtp_connection()
+                # send_message直接把报文流式写入socket，避免as_string()再整体复制一份
+                server.send_message(msg)
+                _smtp_last_used = time.time()
+                logger.info('[邮件] 已发送至 %s，主题: %s，附件数: %d', to_email, subject, attachment_count)
+                return True
+            except Exception as e:
+                # 连接可能已失效，丢弃以便重建
+                _close_smtp_connection()
+                if attempt == 1:
+                    logger.warning('[邮件] 发送失败（%s），重建连接后重试', e)
+                else:
+                    logger.exception('[邮件] 发送失败')
         return False
 
-def build_email_body_by_project(logs, projects, header: str = '') -> str:
+def build_email_body_by_project(logs, projects, header: str = '', category_map=None) -> str:
     """
     将日志按项目分组，并以“预览模板”格式组织文本。
     为避免循环依赖，所需的模型在函数内部导入。
+    调用方可传入category_map（分类id到TaskCategory的映射）以复用已查询的数据。
     """
     if not logs:
         return (header + '\n\n') if header else '无日志。'
-    # 延迟导入，避免循环
-    from models import TaskCategory
     proj_map = {p.id: p for p in projects}
     proj_to_logs = {}
+    cat_ids = set()
     for l in logs:
         proj_to_logs.setdefault(l.project_id, []).append(l)
-    lines = []
+        if l.task_category_id is not None:
+            cat_ids.add(l.task_category_id)
+    # 用StringIO累积正文，避免维护大列表再一次性join
+    buf = io.StringIO()
+    write = buf.write
     if header:
-        lines.append(header)
-        lines.append('')
-    cat_map = {c.id: c for c in TaskCategory.query.all()}
+        write(header)
+        write('\n\n')
+    if category_map is not None:
+        cat_map = category_map
+    elif cat_ids:
+        # 延迟导入，避免循环；只查日志实际引用到的分类，而非全表
+        from models import TaskCategory
+        cat_map = {c.id: c for c in TaskCategory.query.filter(TaskCategory.id.in_(cat_ids)).all()}
+    else:
+        cat_map = {}
     for pid, plogs in proj_to_logs.items():
         p = proj_map.get(pid)
         if not p:
             continue
         # 项目头
-        lines.append(f'项目：{p.name}')
+        write(f'项目：{p.name}\n')
         if p.hospital_name:
-            lines.append(f'医院：{p.hospital_name}')
+            write(f'医院：{p.hospital_name}\n')
         if p.project_manager:
-            lines.append(f'项目经理：{p.project_manager}')
+            write(f'项目经理：{p.project_manager}\n')
         if p.business_manager:
-            lines.append(f'商务经理：{p.business_manager}')
+            write(f'商务经理：{p.business_manager}\n')
         if p.dev_manager:
-            lines.append(f'研发经理：{p.dev_manager}')
-        lines.append('')
+            write(f'研发经理：{p.dev_manager}\n')
+        write('\n')
         # 日志项
         for l in plogs:
             cat = cat_map.get(l.task_category_id)
             cat_name = cat.name if cat else (l.project_status or '')
-            lines.append(f'【{l.date}】实施日志')
-            lines.append(f'项目状态：{cat_name}')
-            lines.append('今日处理问题：')
-            lines.append(l.content or '')
+            write(f'【{l.date}】实施日志\n')
+            write(f'项目状态：{cat_name}\n')
+            write('今日处理问题：\n')
+            write(l.content or '')
+            write('\n')
             # 支持
-            supports = []
             if l.need_product_support and l.need_product_support != '无':
-                supports.append(f'需要产品支持：{l.need_product_support}')
+                write(f'需要产品支持：{l.need_product_support}\n')
             if l.need_dev_support and l.need_dev_support != '无':
-                supports.append(f'需要研发支持：{l.need_dev_support}')
+                write(f'需要研发支持：{l.need_dev_support}\n')
             if l.need_test_support and l.need_test_support != '无':
-                supports.append(f'需要测试支持：{l.need_test_support}')
+                write(f'需要测试支持：{l.need_test_support}\n')
             if l.need_business_support and l.need_business_support != '无':
-                supports.append(f'需要商务支持：{l.need_business_support}')
+                write(f'需要商务支持：{l.need_business_support}\n')
             if l.need_customer_support and l.need_customer_support != '无':
-                supports.append(f'需要客户支持：{l.need_customer_support}')
-            if supports:
-                lines.extend(supports)
+                write(f'需要客户支持：{l.need_customer_support}\n')
             if l.next_plan and l.next_plan.strip() and l.next_plan.strip() != '无':
-                lines.append('下一步计划：')
-                lines.append(l.next_plan.strip())
-            lines.append('')
-        lines.append('')
-    return '\n'.join(lines).strip()
+                write('下一步计划：\n')
+                write(l.next_plan.strip())
+                write('\n')
+            write('\n')
+        write('\n')
+    return buf.getvalue().strip()
 
 
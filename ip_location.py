@@ -3,11 +3,14 @@ IP定位服务
 先获取外网IP地址，再使用高精度定位API进行定位
 支持通过医院名称/项目名称查询地理位置，然后与IP定位结果匹配
 """
+import atexit
 import requests
 import json
+import re
 import os
 import math
 import logging
+import threading
 import time
 from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -15,19 +18,117 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # 配置日志
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+except ImportError:
+    # orjson未安装时回退到requests自带的stdlib json解析
+    orjson = None
+
+def _resp_json(response):
+    """解析HTTP响应的JSON正文（优先orjson，C实现，小对象也快数倍）"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+# 模块级共享会话：复用TCP/TLS连接，避免每次定位请求都重新握手；
+# 连接池加大到20，批量地理编码和IP竞速的并发请求不会把彼此的连接挤出池外
+_session = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=1)
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+
 # 缓存配置
 _location_cache = {}  # IP定位缓存 {ip: (result, timestamp)}
 _hospital_cache = {}  # 医院地理位置缓存 {key: (result, timestamp)}
 _cache_ttl = 3600  # 缓存有效期（秒），1小时
+_negative_cache_ttl = 60  # 失败结果的缓存有效期（秒）：避免对已知坏IP反复打满整条降级链，但很快重试
+_hospital_cache_ttl = 86400 * 7  # 医院地理编码一周有效：医院不会搬家，没必要每小时重新查一遍
 _max_workers = 5  # 并发查询的最大线程数
+_geo_prefilter_enabled = True  # 文本预筛开关：排查匹配问题时可关掉，让所有项目都走地理编码
+_cache_lock = threading.Lock()  # match_projects_by_location的线程池会并发写_hospital_cache
+
+def _first_str(value):
+    """把可能是列表/None/其他类型的字段统一成字符串（列表取首个元素）
+
+    高德等API的province/city字段偶尔会以列表形式返回空值。
+    """
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    return str(value) if value else ''
+
+def _cache_get(cache, key, ttl=None):
+    """读取TTL缓存，过期条目顺手清除，未命中返回None
+
+    失败结果（success为False）用更短的TTL：既避免每次请求都把
+    AMap→ipinfo→ipapi→ip.sb整条降级链重新打一遍，又能在网络恢复后尽快重试。
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    result, timestamp = entry
+    if ttl is None:
+        ttl = _cache_ttl
+    if isinstance(result, dict) and not result.get('success', True):
+        ttl = _negative_cache_ttl
+    if time.time() - timestamp >= ttl:
+        with _cache_lock:
+            cache.pop(key, None)
+        return None
+    return result
+
+def _cache_set(cache, key, result, max_size):
+    """写入TTL缓存，超出容量时淘汰最旧条目（容量上限很小，线性扫描开销可忽略）"""
+    with _cache_lock:
+        cache[key] = (result, time.time())
+        if len(cache) > max_size:
+            oldest_key = min(cache.items(), key=lambda x: x[1][1])[0]
+            del cache[oldest_key]
+
+# 缓存落盘：进程重启（或CLI一次性调用）后不必重新付出整套地理编码的网络开销。
+# 内容均为JSON可序列化的dict+时间戳，读入后过期判断照常由_cache_get完成
+_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.geo_cache.json')
+
+def _load_caches_from_disk():
+    try:
+        with open(_CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        _location_cache.update(data.get('location', {}))
+        _hospital_cache.update(data.get('hospital', {}))
+        logger.debug(f'[IP定位] 已从磁盘加载缓存: {len(_location_cache)}条IP定位, {len(_hospital_cache)}条医院定位')
+    except (OSError, ValueError):
+        # 文件不存在或损坏时从空缓存开始
+        pass
+
+def _save_caches_to_disk():
+    try:
+        with _cache_lock:
+            data = {'location': _location_cache, 'hospital': _hospital_cache}
+            with open(_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+    except OSError as e:
+        logger.debug(f'[IP定位] 缓存落盘失败: {e}')
+
+_load_caches_from_disk()
+atexit.register(_save_caches_to_disk)
+
+# 外网IP的短TTL缓存：几分钟内不会变化，重复探测纯属浪费
+_public_ip = None
+_public_ip_at = 0
+_public_ip_ttl = 300
 
 def get_public_ip():
     """
-    获取当前外网IP地址
+    获取当前外网IP地址（结果缓存5分钟）
     
     Returns:
         str: 外网IP地址，失败返回None
     """
+    global _public_ip, _public_ip_at
+    
+    if _public_ip is not None and time.time() - _public_ip_at < _public_ip_ttl:
+        logger.debug(f'[IP定位] 使用缓存的外网IP: {_public_ip}')
+        return _public_ip
+    
     logger.info('[IP定位] 开始获取外网IP地址')
     # 使用多个服务获取外网IP，提高成功率
     ip_services = [
@@ -38,30 +139,44 @@ def get_public_ip():
         'http://ip-api.com/json/?fields=query'
     ]
     
-    for service_url in ip_services:
-        try:
-            logger.debug(f'[IP定位] 尝试从 {service_url} 获取外网IP')
-            response = requests.get(service_url, timeout=3)
-            if response.status_code == 200:
-                data = response.text.strip()
-                # 处理不同的返回格式
-                if service_url.endswith('json'):
-                    try:
-                        json_data = response.json()
-                        ip = json_data.get('ip') or json_data.get('query')
-                        if ip:
-                            logger.info(f'[IP定位] 成功获取外网IP: {ip} (来源: {service_url})')
-                            return ip
-                    except:
-                        pass
-                else:
-                    # 纯文本IP
-                    if data and len(data.split('.')) == 4:
-                        logger.info(f'[IP定位] 成功获取外网IP: {data} (来源: {service_url})')
-                        return data
-        except Exception as e:
-            logger.debug(f'[IP定位] 从 {service_url} 获取IP失败: {e}')
-            continue
+    def _fetch_ip(service_url):
+        """请求单个IP回显服务，失败或格式异常返回None"""
+        response = _session.get(service_url, timeout=3)
+        if response.status_code != 200:
+            return None
+        # 处理不同的返回格式
+        if service_url.endswith('json'):
+            try:
+                json_data = _resp_json(response)
+                return json_data.get('ip') or json_data.get('query')
+            except:
+                return None
+        # 纯文本IP
+        data = response.text.strip()
+        if data and len(data.split('.')) == 4:
+            return data
+        return None
+    
+    # 并发竞速：全部服务同时发起，取最先返回的有效结果，
+    # 总耗时从各服务超时之和降为最快一个的响应时间。
+    # 不能用with语法：退出时shutdown(wait=True)会等最慢的服务跑完超时，
+    # 赢家确定后立即shutdown(wait=False)返回，落后的请求在后台自行结束
+    executor = ThreadPoolExecutor(max_workers=len(ip_services))
+    try:
+        futures = {executor.submit(_fetch_ip, url): url for url in ip_services}
+        for future in as_completed(futures):
+            service_url = futures[future]
+            try:
+                ip = future.result()
+            except Exception as e:
+                logger.debug(f'[IP定位] 从 {service_url} 获取IP失败: {e}')
+                continue
+            if ip:
+                logger.info(f'[IP定位] 成功获取外网IP: {ip} (来源: {service_url})')
+                _public_ip, _public_ip_at = ip, time.time()
+                return ip
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
     
     logger.warning('[IP定位] 所有服务都无法获取外网IP地址')
     return None
@@ -95,15 +210,10 @@ def get_location_by_ip(ip_address=None):
         logger.info(f'[IP定位] 使用提供的IP地址进行定位: {ip_address}')
     
     # 检查缓存
-    cache_key = ip_address
-    if cache_key in _location_cache:
-        result, timestamp = _location_cache[cache_key]
-        if time.time() - timestamp < _cache_ttl:
-            logger.info(f'[IP定位] 使用缓存结果: {ip_address}')
-            return result
-        else:
-            # 缓存过期，删除
-            del _location_cache[cache_key]
+    cached = _cache_get(_location_cache, ip_address)
+    if cached is not None:
+        logger.info(f'[IP定位] 使用缓存结果: {ip_address}')
+        return cached
     
     # 使用高精度IP定位服务
     # 方案1：优先使用高德地图API（对中国IP定位最准确）
@@ -112,23 +222,13 @@ def get_location_by_ip(ip_address=None):
         try:
             logger.info(f'[IP定位] 使用高德地图API查询IP位置: {ip_address}')
             url = f'https://restapi.amap.com/v3/ip?ip={ip_address}&key={api_key}'
-            response = requests.get(url, timeout=5)
+            response = _session.get(url, timeout=5)
             if response.status_code == 200:
-                data = response.json()
+                data = _resp_json(response)
                 if data.get('status') == '1' and data.get('info') == 'OK':
-                    # 处理可能返回列表的情况
-                    province = data.get('province', '')
-                    city = data.get('city', '')
-                    
-                    # 如果是列表，转换为字符串
-                    if isinstance(province, list):
-                        province = province[0] if province else ''
-                    if isinstance(city, list):
-                        city = city[0] if city else ''
-                    
-                    # 确保是字符串类型
-                    province = str(province) if province else ''
-                    city = str(city) if city else ''
+                    # 处理可能返回列表/空值的情况，统一成字符串
+                    province = _first_str(data.get('province', ''))
+                    city = _first_str(data.get('city', ''))
                     
                     # 如果城市和省份都为空，说明高德地图无法定位，继续尝试其他API
                     if not province and not city:
@@ -146,10 +246,7 @@ def get_location_by_ip(ip_address=None):
                         }
                         logger.info(f'[IP定位] 高德地图定位成功: {province} - {city}')
                         # 缓存结果
-                        _location_cache[ip_address] = (location_result, time.time())
-                        if len(_location_cache) > 100:
-                            oldest_key = min(_location_cache.items(), key=lambda x: x[1][1])[0]
-                            del _location_cache[oldest_key]
+                        _cache_set(_location_cache, ip_address, location_result, 100)
                         return location_result
                 else:
                     logger.warning(f'[IP定位] 高德地图API返回失败: {data.get("info", "未知错误")}')
@@ -165,9 +262,9 @@ def get_location_by_ip(ip_address=None):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=5)
+        response = _session.get(url, headers=headers, timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = _resp_json(response)
             if data.get('city') or data.get('region'):
                 # 解析经纬度
                 loc = data.get('loc', '').split(',')
@@ -188,10 +285,7 @@ def get_location_by_ip(ip_address=None):
                 }
                 logger.info(f'[IP定位] ipinfo.io定位成功: {location_result.get("country")} - {location_result.get("region")} - {location_result.get("city")} (经纬度: {latitude}, {longitude})')
                 # 缓存结果
-                _location_cache[ip_address] = (location_result, time.time())
-                if len(_location_cache) > 100:
-                    oldest_key = min(_location_cache.items(), key=lambda x: x[1][1])[0]
-                    del _location_cache[oldest_key]
+                _cache_set(_location_cache, ip_address, location_result, 100)
                 return location_result
             else:
                 logger.warning(f'[IP定位] ipinfo.io返回数据不完整')
@@ -207,9 +301,9 @@ def get_location_by_ip(ip_address=None):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=5)
+        response = _session.get(url, headers=headers, timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = _resp_json(response)
             if not data.get('error'):
                 location_result = {
                     'city': data.get('city', ''),
@@ -225,18 +319,18 @@ def get_location_by_ip(ip_address=None):
                 }
                 logger.info(f'[IP定位] ipapi.co定位成功: {location_result.get("country")} - {location_result.get("region")} - {location_result.get("city")} (经纬度: {location_result.get("latitude")}, {location_result.get("longitude")})')
                 # 缓存结果
-                _location_cache[ip_address] = (location_result, time.time())
-                if len(_location_cache) > 100:
-                    oldest_key = min(_location_cache.items(), key=lambda x: x[1][1])[0]
-                    del _location_cache[oldest_key]
+                _cache_set(_location_cache, ip_address, location_result, 100)
                 return location_result
             else:
                 logger.warning(f'[IP定位] ipapi.co返回错误: {data.get("reason", "未知错误")}')
     except Exception as e:
         logger.error(f'[IP定位] ipapi.co查询失败: {e}')
     
-    # 备用方案
-    return _get_location_fallback(ip_address)
+    # 备用方案（结果同样写入缓存：主要API全部失败时，
+    # 不缓存会导致每次请求都重新走一遍全部失败的网络调用）
+    result = _get_location_fallback(ip_address)
+    _cache_set(_location_cache, ip_address, result, 100)
+    return result
 
 def _get_location_fallback(ip_address=None):
     """
@@ -255,9 +349,9 @@ def _get_location_fallback(ip_address=None):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=5)
+        response = _session.get(url, headers=headers, timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = _resp_json(response)
             if data.get('city') or data.get('region'):
                 location_result = {
                     'city': data.get('city', ''),
@@ -286,6 +380,101 @@ def _get_location_fallback(ip_address=None):
         'success': False
     }
 
+def _parse_geocode(geocode):
+    """解析高德地理编码API返回的单个geocode条目，无经纬度时返回None"""
+    location_str = geocode.get('location', '')
+    if not location_str:
+        return None
+    lon, lat = map(float, location_str.split(','))
+    return {
+        'city': geocode.get('city', ''),
+        'region': geocode.get('province', ''),
+        'district': geocode.get('district', ''),
+        'formatted_address': geocode.get('formatted_address', ''),
+        'latitude': lat,
+        'longitude': lon,
+        'success': True
+    }
+
+# 地名后缀去除用的预编译正则（单次扫描代替逐个replace；长词在前保证优先匹配）
+_CITY_SUFFIX_RE = re.compile('自治州|地区|市|县|区|盟')
+_REGION_SUFFIX_RE = re.compile('特别行政区|自治区|维吾尔|回族|壮族|省|市')
+
+# 高德批量地理编码单次请求的地址上限
+_AMAP_BATCH_SIZE = 10
+
+def get_hospital_locations_batch(items):
+    """
+    批量查询医院地理位置（带缓存）
+
+    高德地理编码API支持batch=true一次查询最多10个地址（|分隔），
+    N个项目从N次HTTPS往返降为⌈N/10⌉次，也更容易控制在key的QPS限额内。
+
+    Args:
+        items: [(查询关键词, 城市或None)] 列表
+
+    Returns:
+        dict: {缓存键: 定位结果或None}，缓存键与get_hospital_location一致
+    """
+    from config import Config
+
+    api_key = Config.AMAP_API_KEY
+    results = {}
+    pending = []  # [(cache_key, 实际查询地址)]
+    seen = set()
+
+    for keyword, city in items:
+        if not keyword:
+            continue
+        cache_key = f"{keyword}_{city or ''}"
+        if cache_key in seen:
+            continue
+        seen.add(cache_key)
+        cached = _cache_get(_hospital_cache, cache_key, ttl=_hospital_cache_ttl)
+        if cached is not None:
+            results[cache_key] = cached
+            continue
+        results[cache_key] = None
+        pending.append((cache_key, f"{city}{keyword}" if city else keyword))
+
+    if not pending:
+        return results
+    if not api_key:
+        logger.warning('[医院定位] 未配置高德地图API Key，无法批量查询医院地理位置')
+        return results
+
+    url = 'https://restapi.amap.com/v3/geocode/geo'
+    for start in range(0, len(pending), _AMAP_BATCH_SIZE):
+        group = pending[start:start + _AMAP_BATCH_SIZE]
+        try:
+            params = {
+                'key': api_key,
+                'address': '|'.join(address for _, address in group),
+                'batch': 'true',
+                'output': 'json'
+            }
+            response = _session.get(url, params=params, timeout=5)
+            if response.status_code != 200:
+                logger.warning(f'[医院定位] 批量查询返回失败: HTTP {response.status_code}')
+                continue
+            data = _resp_json(response)
+            if data.get('status') != '1':
+                logger.warning(f'[医院定位] 批量查询失败: {data.get("info", "未知错误")}')
+                continue
+            # geocodes数组与请求地址顺序一一对应
+            geocodes = data.get('geocodes') or []
+            for (cache_key, address), geocode in zip(group, geocodes):
+                location_result = _parse_geocode(geocode or {})
+                if location_result:
+                    results[cache_key] = location_result
+                    _cache_set(_hospital_cache, cache_key, location_result, 200)
+                else:
+                    logger.warning(f'[医院定位] 批量查询无结果: {address}')
+        except Exception as e:
+            logger.error(f'[医院定位] 批量查询失败: {e}')
+
+    return results
+
 def get_hospital_location(hospital_name, project_name=None, city=None):
     """
     通过医院名称或项目名称查询医院的实际地理位置（带缓存）
@@ -315,14 +504,10 @@ def get_hospital_location(hospital_name, project_name=None, city=None):
     cache_key = f"{query_keyword}_{city or ''}"
     
     # 检查缓存
-    if cache_key in _hospital_cache:
-        result, timestamp = _hospital_cache[cache_key]
-        if time.time() - timestamp < _cache_ttl:
-            logger.debug(f'[医院定位] 使用缓存结果: {query_keyword}')
-            return result
-        else:
-            # 缓存过期，删除
-            del _hospital_cache[cache_key]
+    cached = _cache_get(_hospital_cache, cache_key, ttl=_hospital_cache_ttl)
+    if cached is not None:
+        logger.debug(f'[医院定位] 使用缓存结果: {query_keyword}')
+        return cached
     
     # 如果提供了城市信息，在查询关键词中包含城市名，提高查询精度
     original_keyword = query_keyword
@@ -342,9 +527,9 @@ def get_hospital_location(hospital_name, project_name=None, city=None):
             'output': 'json'
         }
         
-        response = requests.get(url, params=params, timeout=5)
+        response = _session.get(url, params=params, timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = _resp_json(response)
             
             # 高德地图返回格式：
             # {
@@ -363,28 +548,13 @@ def get_hospital_location(hospital_name, project_name=None, city=None):
             
             if data.get('status') == '1' and data.get('count') != '0':
                 geocode = data.get('geocodes', [{}])[0]
-                location_str = geocode.get('location', '')
+                location_result = _parse_geocode(geocode)
                 
-                if location_str:
-                    lon, lat = map(float, location_str.split(','))
-                    
-                    location_result = {
-                        'city': geocode.get('city', ''),
-                        'region': geocode.get('province', ''),
-                        'district': geocode.get('district', ''),
-                        'formatted_address': geocode.get('formatted_address', ''),
-                        'latitude': lat,
-                        'longitude': lon,
-                        'success': True
-                    }
-                    logger.info(f'[医院定位] 查询成功: {location_result.get("region")} - {location_result.get("city")} - {location_result.get("district")} (地址: {location_result.get("formatted_address")}, 经纬度: {lat}, {lon})')
+                if location_result:
+                    logger.info(f'[医院定位] 查询成功: {location_result.get("region")} - {location_result.get("city")} - {location_result.get("district")} (地址: {location_result.get("formatted_address")}, 经纬度: {location_result.get("latitude")}, {location_result.get("longitude")})')
                     
                     # 缓存结果
-                    _hospital_cache[cache_key] = (location_result, time.time())
-                    # 限制缓存大小
-                    if len(_hospital_cache) > 200:
-                        oldest_key = min(_hospital_cache.items(), key=lambda x: x[1][1])[0]
-                        del _hospital_cache[oldest_key]
+                    _cache_set(_hospital_cache, cache_key, location_result, 200)
                     
                     return location_result
                 else:
@@ -409,7 +579,8 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     Returns:
         float: 距离（公里）
     """
-    if not all([lat1, lon1, lat2, lon2]):
+    # 显式判None：坐标为0.0（赤道/本初子午线）是合法值，不能当作缺失
+    if None in (lat1, lon1, lat2, lon2):
         return None
     
     # 将角度转换为弧度
@@ -455,31 +626,10 @@ def match_projects_by_location(location_info, projects):
         logger.warning('[项目匹配] IP定位失败，无法进行匹配')
         return []
     
-    # IP定位信息（处理可能为列表或None的情况）
-    ip_city_raw = location_info.get('city', '')
-    ip_region_raw = location_info.get('region', '')
-    ip_country_raw = location_info.get('country', '')
-    
-    # 转换为字符串并清理
-    if isinstance(ip_city_raw, list):
-        ip_city = str(ip_city_raw[0]) if ip_city_raw else ''
-    else:
-        ip_city = str(ip_city_raw) if ip_city_raw else ''
-    
-    if isinstance(ip_region_raw, list):
-        ip_region = str(ip_region_raw[0]) if ip_region_raw else ''
-    else:
-        ip_region = str(ip_region_raw) if ip_region_raw else ''
-    
-    if isinstance(ip_country_raw, list):
-        ip_country = str(ip_country_raw[0]) if ip_country_raw else ''
-    else:
-        ip_country = str(ip_country_raw) if ip_country_raw else ''
-    
-    # 清理空白字符
-    ip_city = ip_city.strip()
-    ip_region = ip_region.strip()
-    ip_country = ip_country.strip()
+    # IP定位信息（处理可能为列表或None的情况），统一转字符串并清理空白
+    ip_city = _first_str(location_info.get('city', '')).strip()
+    ip_region = _first_str(location_info.get('region', '')).strip()
+    ip_country = _first_str(location_info.get('country', '')).strip()
     
     ip_lat = location_info.get('latitude')
     ip_lon = location_info.get('longitude')
@@ -493,8 +643,8 @@ def match_projects_by_location(location_info, projects):
     ip_country_lower = ip_country.lower()
     
     # 标准化处理（移除常见后缀）
-    ip_city_normalized = ip_city_lower.replace('市', '').replace('县', '').replace('区', '').replace('自治州', '').replace('地区', '').replace('盟', '')
-    ip_region_normalized = ip_region_lower.replace('省', '').replace('市', '').replace('自治区', '').replace('特别行政区', '').replace('维吾尔', '').replace('回族', '').replace('壮族', '')
+    ip_city_normalized = _CITY_SUFFIX_RE.sub('', ip_city_lower)
+    ip_region_normalized = _REGION_SUFFIX_RE.sub('', ip_region_lower)
     
     # 如果检测到非中国IP（可能是VPN），降低匹配要求
     is_vpn = ip_country_lower and 'china' not in ip_country_lower and '中国' not in ip_country_lower
@@ -520,44 +670,47 @@ def match_projects_by_location(location_info, projects):
     
     logger.info(f'[项目匹配] 有效项目数量: {len(valid_projects)}/{len(projects)}')
     
-    # 并发查询医院地理位置
-    def query_hospital_location(project):
-        """查询单个项目的地理位置"""
-        project_id = project.get('id', '未知')
+    # 批量查询医院地理位置：未命中缓存的关键词合并成⌈N/10⌉次高德批量请求
+    def _project_query_key(project):
+        """与get_hospital_location一致的查询关键词和缓存键"""
         project_name = (project.get('name') or '').strip()
         hospital_name = (project.get('hospital_name') or '').strip()
         project_region = (project.get('region') or '').strip()
-        
-        hospital_location = get_hospital_location(
-            hospital_name=hospital_name,
-            project_name=project_name,
-            city=project_region
-        )
-        
-        return project, hospital_location
+        keyword = hospital_name or project_name
+        return keyword, project_region or None
+    
+    # 文本预筛：项目自带region但与IP侧省市毫无文字交集时，基本可断定异地，
+    # 不值得为它花一次地理编码额度（此类项目仍走下方的文本匹配兜底，通常得0分被过滤）
+    def _needs_geocode(project):
+        if not _geo_prefilter_enabled:
+            return True
+        project_region = (project.get('region') or '').strip()
+        if not project_region:
+            # 没有region信息，只能靠地理编码判断
+            return True
+        if not ip_city_normalized and not ip_region_normalized:
+            return True
+        search_text = f"{project_region} {project.get('hospital_name') or ''} {project.get('name') or ''}".lower()
+        for token in (ip_city_normalized, ip_region_normalized):
+            if token and len(token) >= 2 and token in search_text:
+                return True
+        return False
+    
+    geocode_projects = [p for p in valid_projects if _needs_geocode(p)]
+    if len(geocode_projects) < len(valid_projects):
+        logger.info(f'[项目匹配] 文本预筛跳过 {len(valid_projects) - len(geocode_projects)} 个明显异地项目的地理编码')
     
-    # 使用线程池并发查询
-    hospital_locations = {}
     start_time = time.time()
+    batch_results = get_hospital_locations_batch(
+        [_project_query_key(project) for project in geocode_projects])
     
-    with ThreadPoolExecutor(max_workers=_max_workers) as executor:
-        future_to_project = {
-            executor.submit(query_hospital_location, project): project 
-            for project in valid_projects
-        }
-        
-        for future in as_completed(future_to_project):
-            try:
-                project, hospital_location = future.result()
-                hospital_locations[project.get('id')] = hospital_location
-            except Exception as e:
-                project = future_to_project[future]
-                project_id = project.get('id', '未知')
-                logger.error(f'[项目匹配] 项目 ID={project_id} 查询地理位置失败: {e}')
-                hospital_locations[project.get('id')] = None
+    hospital_locations = {}
+    for project in valid_projects:
+        keyword, city = _project_query_key(project)
+        hospital_locations[project.get('id')] = batch_results.get(f"{keyword}_{city or ''}")
     
     query_time = time.time() - start_time
-    logger.info(f'[项目匹配] 并发查询完成，耗时: {query_time:.2f}秒')
+    logger.info(f'[项目匹配] 批量查询完成，耗时: {query_time:.2f}秒')
     
     # 进行匹配评分
     for idx, project in enumerate(valid_projects, 1):
@@ -584,8 +737,8 @@ def match_projects_by_location(location_info, projects):
             # 标准化医院地理位置
             hospital_city_lower = hospital_city.lower()
             hospital_region_lower = hospital_region.lower()
-            hospital_city_normalized = hospital_city_lower.replace('市', '').replace('县', '').replace('区', '').replace('自治州', '').replace('地区', '').replace('盟', '')
-            hospital_region_normalized = hospital_region_lower.replace('省', '').replace('市', '').replace('自治区', '').replace('特别行政区', '').replace('维吾尔', '').replace('回族', '').replace('壮族', '')
+            hospital_city_normalized = _CITY_SUFFIX_RE.sub('', hospital_city_lower)
+            hospital_region_normalized = _REGION_SUFFIX_RE.sub('', hospital_region_lower)
             
             # 1. 城市匹配（最高优先级）
             if ip_city_lower and hospital_city_lower:
@@ -639,23 +792,23 @@ def match_projects_by_location(location_info, projects):
                     # 超过200公里：+0分
                     if distance_km <= 10:
                         score += 30
-                        match_details.append(f'距离匹配(≤10km, +30)')
+                        match_details.append('距离匹配(≤10km, +30)')
                     elif distance_km <= 50:
                         score += 20
-                        match_details.append(f'距离匹配(≤50km, +20)')
+                        match_details.append('距离匹配(≤50km, +20)')
                     elif distance_km <= 100:
                         score += 10
-                        match_details.append(f'距离匹配(≤100km, +10)')
+                        match_details.append('距离匹配(≤100km, +10)')
                     elif distance_km <= 200:
                         score += 5
-                        match_details.append(f'距离匹配(≤200km, +5)')
-                    logger.info(f'[项目匹配] 项目 ID={project_id} 距离计算: {distance_km:.2f}公里')
+                        match_details.append('距离匹配(≤200km, +5)')
+                    logger.info('[项目匹配] 项目 ID=%s 距离计算: %.2f公里', project_id, distance_km)
         else:
             # 如果无法查询到医院地理位置，回退到文本匹配
             logger.warning(f'[项目匹配] 项目 ID={project_id} 无法查询到医院地理位置，使用文本匹配')
             # 使用项目配置的region字段或从项目名称/医院名称中提取
             project_region_lower = project_region.lower() if project_region else ''
-            project_region_normalized = project_region_lower.replace('市', '').replace('县', '').replace('区', '').replace('自治州', '').replace('地区', '').replace('盟', '')
+            project_region_normalized = _CITY_SUFFIX_RE.sub('', project_region_lower)
             
             # 城市匹配
             if ip_city_lower and project_region_lower:
@@ -688,7 +841,10 @@ def match_projects_by_location(location_info, projects):
             score = int(score * 0.7)  # 降低30%的匹配分数
             match_details.append(f'VPN降分({original_score} -> {score})')
         
-        logger.info(f'[项目匹配] 项目 ID={project_id} 匹配结果: 分数={score} (详情: {", ".join(match_details) if match_details else "无匹配项"})')
+        # 懒格式化+级别预判：详情字符串的join只在INFO真正启用时才发生
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('[项目匹配] 项目 ID=%s 匹配结果: 分数=%s (详情: %s)',
+                        project_id, score, ', '.join(match_details) if match_details else '无匹配项')
         
         # 匹配阈值：分数 >= 10 的项目才会被返回
         if score >= 10:
@@ -697,9 +853,10 @@ def match_projects_by_location(location_info, projects):
                 'score': score,
                 'distance_km': distance_km
             })
-            logger.info(f'[项目匹配] 项目 ID={project_id} 匹配成功，分数={score}，距离={distance_km if distance_km else "未知"}km')
+            logger.info('[项目匹配] 项目 ID=%s 匹配成功，分数=%s，距离=%skm',
+                        project_id, score, distance_km if distance_km else '未知')
         else:
-            logger.info(f'[项目匹配] 项目 ID={project_id} 匹配失败，分数={score} < 10（阈值）')
+            logger.info('[项目匹配] 项目 ID=%s 匹配失败，分数=%s < 10（阈值）', project_id, score)
     
     # 按匹配度排序（分数高的在前，如果分数相同，距离近的在前）
     matched_projects.sort(key=lambda x: (
@@ -710,7 +867,8 @@ def match_projects_by_location(location_info, projects):
     logger.info(f'[项目匹配] 匹配完成，共找到 {len(matched_projects)} 个匹配项目')
     for idx, item in enumerate(matched_projects, 1):
         project_id = item['project'].get('id', '未知')
-        logger.info(f'[项目匹配] 匹配项目 [{idx}]: ID={project_id}, 分数={item["score"]}, 距离={item["distance_km"] if item["distance_km"] else "未知"}km')
+        logger.info('[项目匹配] 匹配项目 [%s]: ID=%s, 分数=%s, 距离=%skm',
+                    idx, project_id, item['score'], item['distance_km'] if item['distance_km'] else '未知')
     
     return [item['project'] for item in matched_projects]
 
@@ -4,6 +4,11 @@ MAC地址获取工具
 """
 import re
 
+# 模块级预编译：删除分隔符的转换表和十六进制校验正则，
+# 登录/注册/设备检查每次请求都会走这两个函数
+_SEPARATOR_TABLE = str.maketrans('', '', ':-. ')
+_MAC_RE = re.compile(r'[0-9A-F]{12}')
+
 def validate_mac_address(mac):
     """
     验证MAC地址格式
@@ -18,17 +23,10 @@ def validate_mac_address(mac):
         return False
     
     # 标准化MAC地址（移除分隔符，转为大写）
-    mac = mac.replace(':', '').replace('-', '').replace('.', '').upper()
-    
-    # 检查长度（应该是12个十六进制字符）
-    if len(mac) != 12:
-        return False
-    
-    # 检查是否为有效的十六进制
-    if not re.match(r'^[0-9A-F]{12}$', mac):
-        return False
+    mac = mac.translate(_SEPARATOR_TABLE).upper()
     
-    return True
+    # 检查长度和十六进制（fullmatch隐含长度为12的约束）
+    return _MAC_RE.fullmatch(mac) is not None
 
 def normalize_mac_address(mac):
     """
@@ -44,7 +42,7 @@ def normalize_mac_address(mac):
         return ''
     
     # 移除所有分隔符
-    mac = mac.replace(':', '').replace('-', '').replace('.', '').upper()
+    mac = mac.translate(_SEPARATOR_TABLE).upper()
     
     # 检查长度
     if len(mac) != 12:
@@ -2,15 +2,27 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import hashlib
+import threading
+import time
 
 db = SQLAlchemy()
 
+# 多设备口令校验结果缓存：{(口令哈希串, token摘要): 时间戳}
+# check_password_hash的KDF每次要数十毫秒，同一token反复校验时短期内直接复用结果；
+# 只缓存成功结果，且键里带存储的哈希串，口令一旦更换旧缓存自动失效
+_token_verify_cache = {}
+_token_verify_cache_ttl = 60
+_token_verify_cache_max = 1024
+# 多线程服务下并发登录会同时写缓存，淘汰扫描需持锁，避免迭代中字典变更抛RuntimeError
+_token_verify_cache_lock = threading.Lock()
+
 class User(UserMixin, db.Model):
     """用户表"""
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
-    real_name = db.Column(db.String(100), nullable=False)  # 真实姓名（作为用户名）
+    real_name = db.Column(db.String(100), nullable=False, index=True)  # 真实姓名（作为用户名），登录/注册按姓名查找
     mac_address = db.Column(db.String(50), nullable=False)  # MAC地址（主设备）
     multi_device_token = db.Column(db.String(255), nullable=True)  # 多设备登录口令（加密存储）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -27,7 +39,20 @@ class User(UserMixin, db.Model):
         """验证多设备登录口令"""
         if not self.multi_device_token:
             return False
-        return check_password_hash(self.multi_device_token, token)
+        key = (self.multi_device_token, hashlib.sha256(token.encode('utf-8')).hexdigest())
+        now = time.time()
+        cached_at = _token_verify_cache.get(key)
+        if cached_at is not None and now - cached_at < _token_verify_cache_ttl:
+            return True
+        result = check_password_hash(self.multi_device_token, token)
+        if result:
+            with _token_verify_cache_lock:
+                if len(_token_verify_cache) >= _token_verify_cache_max:
+                    # 淘汰最旧的缓存项
+                    oldest_key = min(_token_verify_cache.items(), key=lambda x: x[1])[0]
+                    del _token_verify_cache[oldest_key]
+                _token_verify_cache[key] = now
+        return result
     
     def to_dict(self):
         return {
@@ -43,7 +68,7 @@ class UserDevice(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    mac_address = db.Column(db.String(50), nullable=False)  # 设备MAC地址
+    mac_address = db.Column(db.String(50), nullable=False, index=True)  # 设备MAC地址，自动登录按MAC查找
     device_name = db.Column(db.String(100), nullable=True)  # 设备名称（可选）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, default=datetime.utcnow)
@@ -174,6 +199,13 @@ class Log(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 组合索引：周报/邮件摘要的热点查询都是按项目+日期范围过滤
+    __table_args__ = (
+        # 同一项目同一天仅允许一条日志，由数据库层保证（并发提交也不会重复）
+        db.UniqueConstraint('project_id', 'date', name='uq_log_project_date'),
+        db.Index('ix_logs_project_date', 'project_id', 'date'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
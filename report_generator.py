@@ -1,11 +1,96 @@
 from docxtpl import DocxTemplate, InlineImage
 from models import Log, TaskCategory
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import io
 import os
 import shutil
+import time
 from config import Config
-from ai_summarizer import summarize_weekly_logs, summarize_next_week_plans, summarize_support_requirements
+from ai_summarizer import summarize_report_sections_concurrently, format_logs_simple
 from docx.shared import Mm
+import jinja2
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 路径常量：进程生命周期内不变，避免每次生成报告都重算dirname链
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_STATIC_ROOT = os.path.dirname(os.path.dirname(_HERE))
+
+# 模板文件字节缓存：{路径: (mtime, 文件内容)}
+# 批量生成周报时（如定时任务遍历所有项目）同一模板只读盘一次；
+# DocxTemplate对象渲染时会被修改，不能直接缓存，缓存字节后每次从内存构建
+_template_bytes_cache = {}
+
+def _load_template(template_path):
+    """从缓存的文件字节构建DocxTemplate（mtime变化时自动重新读取）"""
+    mtime = os.path.getmtime(template_path)
+    cached = _template_bytes_cache.get(template_path)
+    if cached is None or cached[0] != mtime:
+        with open(template_path, 'rb') as f:
+            cached = (mtime, f.read())
+        _template_bytes_cache[template_path] = cached
+    return DocxTemplate(io.BytesIO(cached[1]))
+
+# 共享的Jinja2环境：docxtpl默认每次render都新建Environment，
+# 复用一个环境省去每次渲染的环境构建和过滤器注册开销
+_JINJA_ENV = jinja2.Environment()
+
+# docx2pdf底层调用Word/LibreOffice，不支持并发，用单线程执行器串行转换，
+# 并发的周报生成任务排队复用同一个转换进程，避免反复冷启动
+_PDF_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-convert')
+_PDF_CONVERT_TIMEOUT = 120  # 单个文件转换超时（秒）
+
+def convert_docx_to_pdf(docx_path):
+    """把Word文档转换为PDF，返回PDF路径；失败时抛出异常"""
+    from docx2pdf import convert
+    pdf_path = docx_path.replace('.docx', '.pdf')
+    future = _PDF_EXECUTOR.submit(convert, docx_path, pdf_path)
+    future.result(timeout=_PDF_CONVERT_TIMEOUT)
+    return pdf_path
+
+# 模板存在性检查的短TTL缓存：{路径: (结果, 时间戳)}
+# 批量生成时同一模板路径反复stat()纯属浪费，5秒内复用结果
+_exists_cache = {}
+_exists_cache_ttl = 5
+
+def _path_exists(path):
+    """带短TTL缓存的os.path.exists"""
+    now = time.time()
+    cached = _exists_cache.get(path)
+    if cached is not None and now - cached[1] < _exists_cache_ttl:
+        return cached[0]
+    result = os.path.exists(path)
+    _exists_cache[path] = (result, now)
+    return result
+
+# 目录创建/默认模板复制只需每个进程执行一次
+_report_env_ready = False
+
+def _ensure_report_environment():
+    """确保模板目录、默认模板文件和输出目录就绪（只执行一次）"""
+    global _report_env_ready
+    if _report_env_ready:
+        return
+    template_dir = os.path.dirname(Config.REPORT_TEMPLATE_PATH)
+    os.makedirs(template_dir, exist_ok=True)
+    os.makedirs(Config.REPORT_OUTPUT_DIR, exist_ok=True)
+    
+    # 检查默认模板文件是否存在
+    if not os.path.exists(Config.REPORT_TEMPLATE_PATH):
+        # 尝试从项目根目录复制模板文件
+        source_template = os.path.join(_HERE, 
+                                      '北京高博【门诊生成式病历项目】周报及计划(20251110至20251114).docx')
+        if os.path.exists(source_template):
+            shutil.copy(source_template, Config.REPORT_TEMPLATE_PATH)
+        else:
+            raise FileNotFoundError(
+                f'模板文件不存在: {Config.REPORT_TEMPLATE_PATH}\n'
+                f'请将模板文件"北京高博【门诊生成式病历项目】周报及计划(20251110至20251114).docx"复制到: {Config.REPORT_TEMPLATE_PATH}'
+            )
+    _report_env_ready = True
 
 def generate_weekly_report(project, week_start_date, format_type='word'):
     """
@@ -22,65 +107,81 @@ def generate_weekly_report(project, week_start_date, format_type='word'):
     week_end_date = week_start_date + timedelta(days=6)
     next_week_start = week_end_date + timedelta(days=1)
     next_week_end = next_week_start + timedelta(days=6)
+    # 各日期字符串只格式化一次，后文多处复用
+    next_week_start_str = next_week_start.strftime('%Y-%m-%d')
+    next_week_end_str = next_week_end.strftime('%Y-%m-%d')
     
     # 确定使用的模板路径（优先使用项目自定义模板，否则使用系统默认模板）
-    template_path = None
-    if project.report_template and os.path.exists(project.report_template):
+    if project.report_template and _path_exists(project.report_template):
         template_path = project.report_template
     else:
-        # 使用系统默认模板
-        template_dir = os.path.dirname(Config.REPORT_TEMPLATE_PATH)
-        os.makedirs(template_dir, exist_ok=True)
-        
-        # 检查模板文件是否存在
-        if not os.path.exists(Config.REPORT_TEMPLATE_PATH):
-            # 尝试从项目根目录复制模板文件
-            project_root = os.path.dirname(os.path.abspath(__file__))
-            source_template = os.path.join(project_root, 
-                                          '北京高博【门诊生成式病历项目】周报及计划(20251110至20251114).docx')
-            if os.path.exists(source_template):
-                shutil.copy(source_template, Config.REPORT_TEMPLATE_PATH)
-            else:
-                raise FileNotFoundError(
-                    f'模板文件不存在: {Config.REPORT_TEMPLATE_PATH}\n'
-                    f'请将模板文件"北京高博【门诊生成式病历项目】周报及计划(20251110至20251114).docx"复制到: {Config.REPORT_TEMPLATE_PATH}'
-                )
+        # 使用系统默认模板（目录创建和模板复制每个进程只做一次）
+        _ensure_report_environment()
         template_path = Config.REPORT_TEMPLATE_PATH
     
     # 加载模板
-    doc = DocxTemplate(template_path)
+    doc = _load_template(template_path)
     
-    # 获取该周的日志
-    logs = Log.query.filter_by(project_id=project.id).filter(
+    # 获取该周的日志（joinedload避免后续访问log.task_category逐条触发SELECT）
+    logs = Log.query.options(joinedload(Log.task_category)).filter_by(project_id=project.id).filter(
         Log.date >= week_start_date,
         Log.date <= week_end_date
     ).join(TaskCategory, Log.task_category_id == TaskCategory.id).order_by(Log.date, TaskCategory.order).all()
     
-    # 按日期组织日志数据
+    # 单次遍历日志，同时构建按日期分组数据和各AI输入列表
+    # （避免多次遍历重复触发ORM属性访问和strftime）
     logs_by_date = {}
+    logs_for_ai = []
+    logs_for_plan_ai = []
+    logs_for_support_ai = []
     for log in logs:
         date_str = log.date.strftime('%Y-%m-%d')
+        date_cn = log.date.strftime('%Y年%m月%d日')
+        category_name = log.task_category.name
+        content = log.content
+        next_plan = log.next_plan.strip() if log.next_plan and log.next_plan.strip() and log.next_plan.strip() != '无' else ''
         if date_str not in logs_by_date:
             logs_by_date[date_str] = []
         logs_by_date[date_str].append({
-            'date': log.date.strftime('%Y年%m月%d日'),
+            'date': date_cn,
             'date_short': log.date.strftime('%m月%d日'),
-            'category': log.task_category.name,
-            'content': log.content,
-            'next_plan': log.next_plan if log.next_plan and log.next_plan.strip() and log.next_plan.strip() != '无' else None
+            'category': category_name,
+            'content': content,
+            'next_plan': next_plan or None
+        })
+        logs_for_ai.append({
+            'date': date_cn,
+            'category': category_name,
+            'content': content
+        })
+        if next_plan:
+            logs_for_plan_ai.append({
+                'date': date_cn,
+                'category': category_name,
+                'content': content,
+                'next_plan': next_plan
+            })
+        logs_for_support_ai.append({
+            'date': date_cn,
+            'category': category_name,
+            'content': content,
+            'next_plan': next_plan,
+            'need_product_support': log.need_product_support if log.need_product_support and log.need_product_support.strip() and log.need_product_support.strip() != '无' else '',
+            'need_dev_support': log.need_dev_support if log.need_dev_support and log.need_dev_support.strip() and log.need_dev_support.strip() != '无' else '',
+            'need_test_support': log.need_test_support if log.need_test_support and log.need_test_support.strip() and log.need_test_support.strip() != '无' else '',
+            'need_business_support': log.need_business_support if log.need_business_support and log.need_business_support.strip() and log.need_business_support.strip() != '无' else '',
+            'need_customer_support': log.need_customer_support if log.need_customer_support and log.need_customer_support.strip() and log.need_customer_support.strip() != '无' else ''
         })
     
     # 准备日志列表（用于模板中的循环）
+    # 查询已按日期排序，dict按插入顺序保存，无需再排序
     logs_list = []
-    sorted_dates = sorted(logs_by_date.keys())
-    for date_str in sorted_dates:
-        for log_item in logs_by_date[date_str]:
-            logs_list.append(log_item)
+    for logs_for_date in logs_by_date.values():
+        logs_list.extend(logs_for_date)
     
     # 按日期分组的日志（用于按日期显示）
     logs_by_date_list = []
-    for date_str in sorted_dates:
-        logs_for_date = logs_by_date[date_str]
+    for logs_for_date in logs_by_date.values():
         # 按分类组织
         categories_dict = {}
         for log_item in logs_for_date:
@@ -99,149 +200,43 @@ def generate_weekly_report(project, week_start_date, format_type='word'):
     # 注意：这个会在AI整理后更新，先创建空列表
     next_plans = []
     
-    # 使用AI整理本周工作总结（表格格式）
-    logs_for_ai = []
-    for log in logs:
-        logs_for_ai.append({
-            'date': log.date.strftime('%Y年%m月%d日'),
-            'category': log.task_category.name,
-            'content': log.content
-        })
-    
-    # 调用AI整理工作总结
-    try:
-        weekly_summary = summarize_weekly_logs(logs_for_ai, project.project_scope)
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f'AI整理工作总结失败: {e}')
-        # 失败时使用简单格式化
-        weekly_summary = []
-        seen_descriptions = set()
-        for i, log in enumerate(logs, 1):
-            category = log.task_category.name
-            content = log.content
-            description = f"【{category}】{content[:50]}{'...' if len(content) > 50 else ''}"
-            if description not in seen_descriptions:
-                weekly_summary.append({
-                    '序号': len(weekly_summary) + 1,
-                    '工作描述': description,
-                    '状态': '已完成',
-                    '备注': content[:100] if len(content) > 100 else content
-                })
-                seen_descriptions.add(description)
-    
-    # 使用AI整理下周工作计划（表格格式）
-    logs_for_plan_ai = []
-    for log in logs:
-        if log.next_plan and log.next_plan.strip() and log.next_plan.strip() != '无':
-            logs_for_plan_ai.append({
-                'date': log.date.strftime('%Y年%m月%d日'),
-                'category': log.task_category.name,
-                'content': log.content,
-                'next_plan': log.next_plan.strip()
-            })
-    
-    # 调用AI整理工作计划
+    # 并发执行三个AI整理任务（各任务内部已有失败降级为简单格式化的逻辑）
     try:
-        next_week_plans_table = summarize_next_week_plans(logs_for_plan_ai, next_week_start.strftime('%Y-%m-%d'), next_week_end.strftime('%Y-%m-%d'))
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f'AI整理工作计划失败: {e}')
-        # 失败时使用简单格式化（会自动估算计划截至日期）
-        from ai_summarizer import format_plans_simple
-        logs_for_plan_simple = []
-        for log in logs:
-            if log.next_plan and log.next_plan.strip() and log.next_plan.strip() != '无':
-                logs_for_plan_simple.append({
-                    'date': log.date.strftime('%Y年%m月%d日'),
-                    'category': log.task_category.name,
-                    'content': log.content,
-                    'next_plan': log.next_plan.strip()
-                })
-        next_week_plans_table = format_plans_simple(logs_for_plan_simple, next_week_start.strftime('%Y-%m-%d'))
-    
+        weekly_summary, next_week_plans_table, support_requirements_table = summarize_report_sections_concurrently(
+            logs_for_ai, project.project_scope,
+            logs_for_plan_ai, logs_for_support_ai,
+            next_week_start_str, next_week_end_str)
+    except Exception:
+        logger.error('AI整理报告内容失败', exc_info=True)
+        # 兜底：本周总结使用简单格式化，计划/支持需求留空（下方会补默认项）
+        weekly_summary = format_logs_simple(logs_for_ai)
+        next_week_plans_table = []
+        support_requirements_table = []
+
     # 如果没有计划，添加默认项
     if not next_week_plans_table:
         # 默认计划截至日期为下周结束日期
         next_week_plans_table.append({
             '序号': 1,
             '工作描述': '（待补充）',
-            '预计开始时间': next_week_start.strftime('%Y-%m-%d'),
-            '计划截至': next_week_end.strftime('%Y-%m-%d'),
+            '预计开始时间': next_week_start_str,
+            '计划截至': next_week_end_str,
             '备注': ''
         })
     
     # 更新next_plans（旧格式，用于Word模板中的plan变量）
-    # 从next_week_plans_table中提取数据，添加预计所需时间字段
+    # 同时在原字典上补齐模板需要的"预计所需时间"兼容字段，避免渲染前再整表复制
     next_plans = []
     for item in next_week_plans_table:
+        item['预计所需时间'] = item.get('计划截至', next_week_end_str)  # AI自动生成的计划截至日期
         next_plans.append({
             'content': item.get('工作描述', ''),
-            'start_date': item.get('预计开始时间', next_week_start.strftime('%Y-%m-%d')),
-            'end_date': item.get('计划截至', next_week_end.strftime('%Y-%m-%d')),
-            '预计所需时间': item.get('计划截至', next_week_end.strftime('%Y-%m-%d')),  # AI自动生成的计划截至日期
+            'start_date': item.get('预计开始时间', next_week_start_str),
+            'end_date': item['预计所需时间'],
+            '预计所需时间': item['预计所需时间'],
             'note': item.get('备注', '')
         })
     
-    # 使用AI整理支持需求表格
-    # 按日志顺序收集所有日志数据（包括支持字段），以便检查后续日志内容
-    logs_for_support_ai = []
-    for log in logs:
-        log_data = {
-            'date': log.date.strftime('%Y年%m月%d日'),
-            'category': log.task_category.name,
-            'content': log.content,
-            'next_plan': log.next_plan.strip() if log.next_plan and log.next_plan.strip() and log.next_plan.strip() != '无' else '',
-            'need_product_support': log.need_product_support if log.need_product_support and log.need_product_support.strip() and log.need_product_support.strip() != '无' else '',
-            'need_dev_support': log.need_dev_support if log.need_dev_support and log.need_dev_support.strip() and log.need_dev_support.strip() != '无' else '',
-            'need_test_support': log.need_test_support if log.need_test_support and log.need_test_support.strip() and log.need_test_support.strip() != '无' else '',
-            'need_business_support': log.need_business_support if log.need_business_support and log.need_business_support.strip() and log.need_business_support.strip() != '无' else '',
-            'need_customer_support': log.need_customer_support if log.need_customer_support and log.need_customer_support.strip() and log.need_customer_support.strip() != '无' else ''
-        }
-        logs_for_support_ai.append(log_data)
-    
-    # 调用AI整理支持需求
-    try:
-        support_requirements_table = summarize_support_requirements(logs_for_support_ai, next_week_start.strftime('%Y-%m-%d'), next_week_end.strftime('%Y-%m-%d'))
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f'AI整理支持需求失败: {e}')
-        # 失败时使用简单格式化（format_support_simple会自动处理后续日志检查）
-        from ai_summarizer import format_support_simple
-        # 构建支持需求列表（包含后续日志信息）
-        support_requirements_list = []
-        support_types = {
-            'need_product_support': '产品支持',
-            'need_dev_support': '研发支持',
-            'need_test_support': '测试支持',
-            'need_business_support': '商务支持',
-            'need_customer_support': '客户支持'
-        }
-        for i, log_data in enumerate(logs_for_support_ai):
-            for support_field, support_name in support_types.items():
-                support_content = log_data.get(support_field, '')
-                if support_content:
-                    # 收集后续日志内容
-                    subsequent_contents = []
-                    for j in range(i + 1, len(logs_for_support_ai)):
-                        subsequent_contents.append({
-                            'date': logs_for_support_ai[j].get('date', ''),
-                            'content': logs_for_support_ai[j].get('content', '')
-                        })
-                    support_requirements_list.append({
-                        'date': log_data.get('date', ''),
-                        'category': log_data.get('category', ''),
-                        'content': log_data.get('content', ''),
-                        'next_plan': log_data.get('next_plan', ''),
-                        'support_type': support_name,
-                        'support_content': support_content,
-                        'subsequent_contents': subsequent_contents
-                    })
-        support_requirements_table = format_support_simple(support_requirements_list, next_week_start.strftime('%Y-%m-%d'))
-    
     # 处理医院logo图片
     hospital_logo_image = None
     if project.hospital_logo:
@@ -250,18 +245,16 @@ def generate_weekly_report(project, week_start_date, format_type='word'):
         if not os.path.isabs(logo_path):
             # 从/static/uploads/logos/xxx.png转换为实际文件路径
             if logo_path.startswith('/static/'):
-                logo_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), logo_path.lstrip('/'))
+                logo_path = os.path.join(_STATIC_ROOT, logo_path.lstrip('/'))
             else:
-                logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), logo_path)
+                logo_path = os.path.join(_HERE, logo_path)
         
         if os.path.exists(logo_path):
             try:
                 # 创建InlineImage对象，设置宽度为40mm（约150像素）
                 hospital_logo_image = InlineImage(doc, logo_path, width=Mm(40))
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.warning(f'无法加载医院logo图片: {e}')
+            except Exception:
+                logger.warning('无法加载医院logo图片', exc_info=True)
                 hospital_logo_image = None
     
     # 准备上下文数据
@@ -286,8 +279,8 @@ def generate_weekly_report(project, week_start_date, format_type='word'):
         # 下周日期
         'next_week_start': next_week_start.strftime('%Y年%m月%d日'),
         'next_week_end': next_week_end.strftime('%Y年 %m月%d日'),
-        'next_week_start_short': next_week_start.strftime('%Y-%m-%d'),
-        'next_week_end_short': next_week_end.strftime('%Y-%m-%d'),
+        'next_week_start_short': next_week_start_str,
+        'next_week_end_short': next_week_end_str,
         
         # 日志数据
         'logs': logs_list,  # 所有日志的平铺列表
@@ -298,11 +291,9 @@ def generate_weekly_report(project, week_start_date, format_type='word'):
         
         # AI整理后的表格数据
         'weekly_summary_table': weekly_summary,  # 本周工作总结表格：序号、工作描述、状态、备注
-        # 为Word模板添加兼容字段：预计所需时间（等于计划截至）
-        'next_week_plans_table': [
-            {**item, '预计所需时间': item.get('计划截至', '')} 
-            for item in next_week_plans_table
-        ],  # 下周工作计划表格：序号、工作描述、预计开始时间、计划截至、预计所需时间、备注
+        # 下周工作计划表格：序号、工作描述、预计开始时间、计划截至、预计所需时间、备注
+        # （"预计所需时间"兼容字段已在上方next_plans循环中就地补齐）
+        'next_week_plans_table': next_week_plans_table,
         'support_requirements_table': support_requirements_table,  # 支持需求表格：序号、内容、支持方、时间要求
         
         # 本周完成工作（旧格式，保持兼容）
@@ -318,26 +309,20 @@ def generate_weekly_report(project, week_start_date, format_type='word'):
     }
     
     # 渲染模板
-    doc.render(context)
+    doc.render(context, jinja_env=_JINJA_ENV)
     
-    # 保存Word文档
+    # 保存Word文档（输出目录已在_ensure_report_environment中创建）
     filename = f'{project.name}周报及计划({week_start_date.strftime("%Y%m%d")}至{week_end_date.strftime("%Y%m%d")}).docx'
     file_path = os.path.join(Config.REPORT_OUTPUT_DIR, filename)
     
-    # 确保输出目录存在
-    os.makedirs(Config.REPORT_OUTPUT_DIR, exist_ok=True)
-    
     doc.save(file_path)
     
     # 如果需要PDF格式
     if format_type == 'pdf':
         try:
-            from docx2pdf import convert
-            pdf_path = file_path.replace('.docx', '.pdf')
-            convert(file_path, pdf_path)
-            return pdf_path
-        except Exception as e:
-            print(f'PDF转换失败: {e}')
+            return convert_docx_to_pdf(file_path)
+        except Exception:
+            logger.error('PDF转换失败', exc_info=True)
             return file_path
     
     return file_path
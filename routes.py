@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, jsonify, send_file, redirect, url_for, flash
+from flask import Blueprint, render_template, request, jsonify, send_file, redirect, url_for, flash, g, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, Project, Log, TaskCategory, User, UserDevice, UserPreference, EmailSetting
 from datetime import datetime, date, timedelta
@@ -7,14 +7,177 @@ from ip_location import get_location_by_ip, match_projects_by_location, get_hosp
 from cities_data import CITIES_DATA, get_all_cities, get_cities_by_province, search_cities
 from mac_address import validate_mac_address, normalize_mac_address
 import os
+import shutil
 from config import Config
 from email_utils import send_email, build_email_body_by_project
 from werkzeug.utils import secure_filename
 import uuid
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response
+from sqlalchemy.exc import IntegrityError
+
+try:
+    import orjson
+except ImportError:
+    # orjson未安装时回退到jsonify
+    orjson = None
+
+def _json_response(obj, status=200):
+    """序列化JSON响应（优先使用orjson，C实现，比stdlib快数倍）"""
+    if orjson is not None:
+        return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+    return jsonify(obj), status
+
+# 旧logo/模板文件的删除放到后台线程执行，磁盘IO不占用请求线程
+_cleanup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='file-cleanup')
+
+def _remove_file_async(path):
+    """后台删除文件，忽略文件不存在等错误"""
+    def _remove(p):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+    _cleanup_executor.submit(_remove, path)
+
+# 设备MAC到用户的查询缓存：{规范化MAC: ((user_id, real_name)或None, 时间戳)}
+# /api/check-device在每次打开登录页时都会被轮询，是最热的查询路径；
+# waitress多线程并发读写同一字典，淘汰扫描必须持锁，否则迭代中字典变更会抛RuntimeError
+_mac_user_cache = {}
+_mac_user_cache_ttl = 300
+_mac_user_cache_max = 4096
+_mac_user_cache_lock = threading.Lock()
+
+# 任务分类固定11条、启动时初始化后不再变更，进程内缓存5分钟
+_task_categories_cache = None
+_task_categories_cache_at = 0
+_task_categories_cache_ttl = 300
+
+def _task_categories():
+    """所有任务分类（按order排序）的字典列表，带进程级TTL缓存"""
+    global _task_categories_cache, _task_categories_cache_at
+    now = time.time()
+    if _task_categories_cache is None or now - _task_categories_cache_at >= _task_categories_cache_ttl:
+        _task_categories_cache = [c.to_dict() for c in TaskCategory.query.order_by(TaskCategory.order).all()]
+        _task_categories_cache_at = now
+    return _task_categories_cache
+
+# logs.content全文索引（ngram解析器）是否可用的探测结果缓存：
+# 存量库需先执行/admin/migrate/indexes，探测失败（如索引未建、非MySQL）每5分钟重试一次
+_content_ft_available = None
+_content_ft_checked_at = 0
+_content_ft_check_ttl = 300
+
+def _fulltext_search_available():
+    """探测logs表是否已建立content全文索引（结果带TTL缓存）"""
+    global _content_ft_available, _content_ft_checked_at
+    now = time.time()
+    if _content_ft_available is None or (not _content_ft_available and
+                                         now - _content_ft_checked_at >= _content_ft_check_ttl):
+        try:
+            rs = db.session.execute(db.text(
+                "SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS "
+                "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME='logs' "
+                "AND INDEX_NAME='ix_logs_content_ft' LIMIT 1"))
+            _content_ft_available = rs.first() is not None
+        except Exception:
+            _content_ft_available = False
+        _content_ft_checked_at = now
+    return _content_ft_available
+
+def _user_projects():
+    """当前用户的项目列表（按创建时间倒序），同一请求内只查询一次（挂在flask.g上）"""
+    projects = getattr(g, '_user_projects', None)
+    if projects is None:
+        projects = Project.query.filter_by(user_id=current_user.id).order_by(Project.created_at.desc()).all()
+        g._user_projects = projects
+    return projects
+
+# /api/cities无参数时返回的是不变的静态结构，进程启动时序列化一次，
+# 配合ETag让浏览器后续直接命中304
+if orjson is not None:
+    import hashlib
+    _CITIES_JSON = orjson.dumps({'type': 'all', 'data': CITIES_DATA})
+    _CITIES_ETAG = hashlib.md5(_CITIES_JSON).hexdigest()
+else:
+    _CITIES_JSON = None
+    _CITIES_ETAG = None
+
+def _parse_iso_date(value):
+    """解析YYYY-MM-DD日期字符串，格式非法时抛ValueError
+
+    date.fromisoformat是C实现，比strptime快一个数量级，
+    且不用每次调用都重新解析格式串
+    """
+    return date.fromisoformat(value)
+
+# last_login写入去抖：5分钟内重复登录/自动登录不再发UPDATE+COMMIT
+_LAST_LOGIN_DEBOUNCE_SECONDS = 300
+
+def _touch_last_login(device):
+    """按需更新设备last_login，5分钟内已更新过则跳过；返回是否有修改"""
+    now = datetime.utcnow()
+    if device.last_login is not None and (now - device.last_login).total_seconds() < _LAST_LOGIN_DEBOUNCE_SECONDS:
+        return False
+    device.last_login = now
+    return True
+
+def _invalidate_mac_cache(mac_address):
+    """设备注册/添加后使对应MAC的缓存失效"""
+    _mac_user_cache.pop(mac_address, None)
+
+def _lookup_user_by_mac(mac_address):
+    """按MAC查找已注册用户，返回(user_id, real_name)或None（带TTL缓存）"""
+    now = time.time()
+    cached = _mac_user_cache.get(mac_address)
+    if cached is not None and now - cached[1] < _mac_user_cache_ttl:
+        return cached[0]
+    # 单条JOIN查询，只取需要的两列，替代设备+用户两次往返
+    row = db.session.query(User.id, User.real_name).join(
+        UserDevice, UserDevice.user_id == User.id
+    ).filter(UserDevice.mac_address == mac_address).first()
+    result = (row[0], row[1]) if row else None
+    with _mac_user_cache_lock:
+        if len(_mac_user_cache) >= _mac_user_cache_max:
+            oldest_key = min(_mac_user_cache.items(), key=lambda x: x[1][1])[0]
+            del _mac_user_cache[oldest_key]
+        _mac_user_cache[mac_address] = (result, now)
+    return result
+
+# 响应压缩参数：小于该字节数的响应不压缩（压缩头开销得不偿失）
+_GZIP_MIN_SIZE = 500
+_GZIP_LEVEL = 5
+_GZIP_MIMETYPES = ('application/json', 'text/html')
 
 def register_routes(app):
     """注册所有路由"""
     
+    @app.after_request
+    def _compress_response(response):
+        """对较大的JSON/HTML响应做gzip压缩，项目列表等接口带宽可降数倍"""
+        if (response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'gzip' not in (request.headers.get('Accept-Encoding') or '').lower()
+                or response.headers.get('Content-Encoding')
+                or not response.mimetype or response.mimetype not in _GZIP_MIMETYPES):
+            return response
+        data = response.get_data()
+        if len(data) < _GZIP_MIN_SIZE:
+            return response
+        import gzip
+        compressed = gzip.compress(data, compresslevel=_GZIP_LEVEL)
+        # 压缩无收益时保持原样
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers.add('Vary', 'Accept-Encoding')
+        return response
+    
     @app.route('/login', methods=['GET', 'POST'])
     def login():
         """登录页面（基于MAC地址+真实姓名）"""
@@ -48,12 +211,15 @@ def register_routes(app):
                 # 更新或创建设备记录
                 device = UserDevice.query.filter_by(user_id=user.id, mac_address=mac_address).first()
                 if device:
-                    device.last_login = datetime.utcnow()
+                    changed = _touch_last_login(device)
                 else:
                     # 如果设备记录不存在，创建它
                     device = UserDevice(user_id=user.id, mac_address=mac_address)
                     db.session.add(device)
-                db.session.commit()
+                    _invalidate_mac_cache(mac_address)
+                    changed = True
+                if changed:
+                    db.session.commit()
                 next_page = request.args.get('next')
                 return redirect(next_page or url_for('index'))
             
@@ -66,8 +232,11 @@ def register_routes(app):
                     if not device:
                         device = UserDevice(user_id=user.id, mac_address=mac_address)
                         db.session.add(device)
-                    device.last_login = datetime.utcnow()
-                    db.session.commit()
+                        _invalidate_mac_cache(mac_address)
+                        device.last_login = datetime.utcnow()
+                        db.session.commit()
+                    elif _touch_last_login(device):
+                        db.session.commit()
                     
                     logger.info(f'[登录] 多设备验证通过，添加新设备 user_id={user.id}')
                     login_user(user, remember=True)
@@ -85,17 +254,18 @@ def register_routes(app):
         mac_address = request.args.get('mac_address', '').strip()
         if mac_address:
             mac_address = normalize_mac_address(mac_address)
-            # 通过设备指纹查找用户
-            device = UserDevice.query.filter_by(mac_address=mac_address).first()
-            if device:
-                user = User.query.get(device.user_id)
-                if user:
-                    # 自动登录
-                    login_user(user, remember=True)
-                    device.last_login = datetime.utcnow()
+            # 通过设备指纹查找用户（一次JOIN同时取回设备与用户，便于更新last_login）
+            row = db.session.query(UserDevice, User).join(
+                User, User.id == UserDevice.user_id
+            ).filter(UserDevice.mac_address == mac_address).first()
+            if row:
+                device, user = row
+                # 自动登录
+                login_user(user, remember=True)
+                if _touch_last_login(device):
                     db.session.commit()
-                    next_page = request.args.get('next')
-                    return redirect(next_page or url_for('index'))
+                next_page = request.args.get('next')
+                return redirect(next_page or url_for('index'))
             else:
                 logger.info(f'[登录] 新设备首次访问，mac={mac_address} 未登记，等待用户输入姓名与多设备口令')
         
@@ -138,11 +308,18 @@ def register_routes(app):
             is_add_device = request.form.get('is_add_device', '').strip() == '1'
             
             if is_add_device:
-                # 添加新设备模式：通过真实姓名+多设备登录口令验证
-                existing_user = User.query.filter_by(real_name=real_name).first()
-                if not existing_user:
+                # 添加新设备模式：一次查询同时取回用户和“设备是否已登记”标记
+                from sqlalchemy import exists
+                row = db.session.query(
+                    User,
+                    exists().where(
+                        (UserDevice.user_id == User.id) & (UserDevice.mac_address == mac_address)
+                    ).label('has_device')
+                ).filter(User.real_name == real_name).first()
+                if not row:
                     flash('该姓名未注册，请先完成首次注册', 'error')
                     return render_template('register.html', is_add_device=False)
+                existing_user, has_device = row
                 
                 # 验证多设备登录口令
                 if not existing_user.check_multi_device_token(multi_device_token):
@@ -150,8 +327,7 @@ def register_routes(app):
                     return redirect(url_for('register', add_device=1))
                 
                 # 检查设备是否已添加
-                existing_device = UserDevice.query.filter_by(user_id=existing_user.id, mac_address=mac_address).first()
-                if existing_device:
+                if has_device:
                     flash('该设备已添加，请直接登录', 'error')
                     return redirect(url_for('login'))
                 
@@ -159,6 +335,7 @@ def register_routes(app):
                 device = UserDevice(user_id=existing_user.id, mac_address=mac_address)
                 db.session.add(device)
                 db.session.commit()
+                _invalidate_mac_cache(mac_address)
                 
                 # 自动登录
                 login_user(existing_user, remember=True)
@@ -183,6 +360,7 @@ def register_routes(app):
                 db.session.add(device)
                 
                 db.session.commit()
+                _invalidate_mac_cache(mac_address)
                 
                 flash('注册成功！请使用您的姓名登录', 'success')
                 return redirect(url_for('login'))
@@ -203,48 +381,36 @@ def register_routes(app):
         """项目展示首页"""
         from sqlalchemy import func
         
-        # 优化：使用聚合查询一次性获取所有项目的日志统计，避免N+1查询
-        projects = Project.query.filter_by(user_id=current_user.id).order_by(Project.created_at.desc()).all()
+        # 优化：项目与日志统计合并为一条外连接聚合查询，单次往返拿到全部数据
+        rows = db.session.query(
+            Project,
+            func.count(Log.id).label('log_count'),
+            func.max(Log.date).label('latest_date')
+        ).outerjoin(Log, Log.project_id == Project.id).filter(
+            Project.user_id == current_user.id
+        ).group_by(Project.id).order_by(Project.created_at.desc()).all()
         
-        if not projects:
+        if not rows:
             return render_template('projects_dashboard.html', 
                                  projects_data=[],
                                  show_first_time_tip=False,
                                  location={},
                                  matched_count=0)
         
-        # 批量查询日志统计（使用聚合查询优化，避免N+1问题）
-        project_ids = [p.id for p in projects]
-        
-        # 查询每个项目的日志数量和最新日志日期（一次性查询所有项目）
-        from sqlalchemy import func
-        log_stats = db.session.query(
-            Log.project_id,
-            func.count(Log.id).label('log_count'),
-            func.max(Log.date).label('latest_date')
-        ).filter(Log.project_id.in_(project_ids)).group_by(Log.project_id).all()
-        
-        # 转换为字典便于查找（O(1)查找）
-        stats_dict = {stat.project_id: {'count': stat.log_count, 'latest_date': stat.latest_date} for stat in log_stats}
-        
         # 性能优化：暂时关闭定位匹配推荐功能，避免首页加载变慢
-        matched_projects = []
         location = {}
         matched_count = 0
         matched_project_ids = set()
         
         # 组装项目数据，并按匹配度排序
-        projects_data = []
         matched_data = []  # 匹配的项目
         unmatched_data = []  # 未匹配的项目
         
-        for project in projects:
-            stats = stats_dict.get(project.id, {'count': 0, 'latest_date': None})
-            
+        for project, log_count, latest_date in rows:
             project_data = {
                 'project': project,
-                'log_count': stats['count'],
-                'latest_log_date': stats['latest_date'],
+                'log_count': log_count,
+                'latest_log_date': latest_date,
                 'is_matched': project.id in matched_project_ids
             }
             
@@ -259,7 +425,7 @@ def register_routes(app):
         # 检查是否是第一次创建项目（只有1个项目且URL参数中有created=1）
         show_first_time_tip = False
         created_param = request.args.get('created')
-        project_count = len(projects)
+        project_count = len(rows)
         
         # 调试日志
         print(f'[DEBUG] created参数: {created_param}, 项目数量: {project_count}')
@@ -322,6 +488,9 @@ def register_routes(app):
         setting.weekly_time = weekly_time
         setting.weekly_weekday = weekly_weekday
         db.session.commit()
+        # 同步更新该用户的精确cron任务（调度器未在本进程运行时为空操作）
+        from scheduler import reschedule_email_jobs
+        reschedule_email_jobs(app, setting)
         return jsonify({'success': True})
     
     @app.route('/api/email/test', methods=['POST'])
@@ -340,9 +509,23 @@ def register_routes(app):
             
             # 今日日志摘要（按项目预览格式组织）
             today_date = date.today()
-            projects = Project.query.filter_by(user_id=current_user.id).all()
-            project_ids = [p.id for p in projects]
-            logs = Log.query.filter(Log.project_id.in_(project_ids)).filter(Log.date == today_date).order_by(Log.project_id, Log.created_at).all()
+            # 正文只用到项目的名称和负责人几列，按列查询即可
+            projects = db.session.query(
+                Project.id, Project.name, Project.hospital_name,
+                Project.project_manager, Project.business_manager,
+                Project.dev_manager
+            ).filter_by(user_id=current_user.id).all()
+            # 项目与当日日志一次JOIN取回，省去先收集project_ids再IN查询的第二次往返
+            # 只取邮件正文需要的列，返回轻量Row元组，省去完整ORM对象的构建与会话跟踪
+            logs = db.session.query(
+                Log.project_id, Log.task_category_id, Log.date, Log.content,
+                Log.project_status, Log.need_product_support, Log.need_dev_support,
+                Log.need_test_support, Log.need_business_support,
+                Log.need_customer_support, Log.next_plan
+            ).join(Project, Project.id == Log.project_id).filter(
+                Project.user_id == current_user.id,
+                Log.date == today_date
+            ).order_by(Log.project_id, Log.created_at).all()
             body = build_email_body_by_project(logs, projects, header=f'【{today_date}】实施日志（测试发送）')
             
             ok = send_email(setting.qq_email, f'今日日志（测试发送）-{today_date}', body, attachments=[])
@@ -363,26 +546,18 @@ def register_routes(app):
         try:
             engine = db.engine
             with engine.connect() as conn:
-                # 检查并添加 daily_time
+                # 一次查出已存在的列，再按缺失情况补ALTER（3次目录查询合并为1次）
                 rs = conn.execute(db.text("""
-                    SELECT COUNT(*) AS c FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME='email_settings' AND TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='daily_time'
+                    SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+                    WHERE TABLE_NAME='email_settings' AND TABLE_SCHEMA=DATABASE()
+                      AND COLUMN_NAME IN ('daily_time', 'weekly_weekday', 'weekly_time')
                 """))
-                if rs.scalar() == 0:
+                existing = {row[0] for row in rs}
+                if 'daily_time' not in existing:
                     conn.execute(db.text("ALTER TABLE email_settings ADD COLUMN daily_time VARCHAR(5) NULL DEFAULT '07:00'"))
-                # weekly_weekday
-                rs = conn.execute(db.text("""
-                    SELECT COUNT(*) AS c FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME='email_settings' AND TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='weekly_weekday'
-                """))
-                if rs.scalar() == 0:
+                if 'weekly_weekday' not in existing:
                     conn.execute(db.text("ALTER TABLE email_settings ADD COLUMN weekly_weekday INT NULL DEFAULT 4"))
-                # weekly_time
-                rs = conn.execute(db.text("""
-                    SELECT COUNT(*) AS c FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME='email_settings' AND TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='weekly_time'
-                """))
-                if rs.scalar() == 0:
+                if 'weekly_time' not in existing:
                     conn.execute(db.text("ALTER TABLE email_settings ADD COLUMN weekly_time VARCHAR(5) NULL DEFAULT '07:00'"))
             db.session.commit()
             return jsonify({'success': True})
@@ -397,28 +572,18 @@ def register_routes(app):
         try:
             engine = db.engine
             with engine.begin() as conn:
-                # 检查并添加 project_goal
+                # 一次查出已存在的列，再按缺失情况补ALTER（3次目录查询合并为1次）
                 rs = conn.execute(db.text("""
-                    SELECT COUNT(*) AS c FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME='projects' AND TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='project_goal'
+                    SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+                    WHERE TABLE_NAME='projects' AND TABLE_SCHEMA=DATABASE()
+                      AND COLUMN_NAME IN ('project_goal', 'project_status', 'hospital_logo')
                 """))
-                if rs.scalar() == 0:
+                existing = {row[0] for row in rs}
+                if 'project_goal' not in existing:
                     conn.execute(db.text("ALTER TABLE projects ADD COLUMN project_goal TEXT NULL"))
-                
-                # 检查并添加 project_status
-                rs = conn.execute(db.text("""
-                    SELECT COUNT(*) AS c FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME='projects' AND TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='project_status'
-                """))
-                if rs.scalar() == 0:
+                if 'project_status' not in existing:
                     conn.execute(db.text("ALTER TABLE projects ADD COLUMN project_status VARCHAR(100) NULL"))
-                
-                # 检查并添加 hospital_logo
-                rs = conn.execute(db.text("""
-                    SELECT COUNT(*) AS c FROM INFORMATION_SCHEMA.COLUMNS
-                    WHERE TABLE_NAME='projects' AND TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='hospital_logo'
-                """))
-                if rs.scalar() == 0:
+                if 'hospital_logo' not in existing:
                     conn.execute(db.text("ALTER TABLE projects ADD COLUMN hospital_logo VARCHAR(500) NULL"))
             
             return jsonify({'success': True, 'message': '项目表字段迁移成功'})
@@ -429,6 +594,38 @@ def register_routes(app):
             print(traceback.format_exc())
             return jsonify({'success': False, 'message': f'迁移失败: {error_msg}'}), 500
     
+    @app.route('/admin/migrate/indexes', methods=['POST'])
+    @login_required
+    def migrate_log_indexes():
+        """为logs表补建组合索引(project_id, date)（新库由create_all自动创建，存量库走此迁移）"""
+        try:
+            engine = db.engine
+            with engine.begin() as conn:
+                rs = conn.execute(db.text("""
+                    SELECT TABLE_NAME, INDEX_NAME FROM INFORMATION_SCHEMA.STATISTICS
+                    WHERE TABLE_SCHEMA=DATABASE()
+                      AND ((TABLE_NAME='logs' AND INDEX_NAME='ix_logs_project_date')
+                        OR (TABLE_NAME='logs' AND INDEX_NAME='uq_log_project_date')
+                        OR (TABLE_NAME='logs' AND INDEX_NAME='ix_logs_content_ft')
+                        OR (TABLE_NAME='users' AND INDEX_NAME='ix_users_real_name')
+                        OR (TABLE_NAME='user_devices' AND INDEX_NAME='ix_user_devices_mac_address'))
+                """))
+                existing = {(row[0], row[1]) for row in rs}
+                if ('logs', 'ix_logs_project_date') not in existing:
+                    conn.execute(db.text("CREATE INDEX ix_logs_project_date ON logs(project_id, date)"))
+                if ('logs', 'uq_log_project_date') not in existing:
+                    conn.execute(db.text("ALTER TABLE logs ADD CONSTRAINT uq_log_project_date UNIQUE (project_id, date)"))
+                if ('logs', 'ix_logs_content_ft') not in existing:
+                    # ngram解析器支持中文分词（MySQL 5.7+内置）
+                    conn.execute(db.text("ALTER TABLE logs ADD FULLTEXT INDEX ix_logs_content_ft (content) WITH PARSER ngram"))
+                if ('users', 'ix_users_real_name') not in existing:
+                    conn.execute(db.text("CREATE INDEX ix_users_real_name ON users(real_name)"))
+                if ('user_devices', 'ix_user_devices_mac_address') not in existing:
+                    conn.execute(db.text("CREATE INDEX ix_user_devices_mac_address ON user_devices(mac_address)"))
+            return jsonify({'success': True, 'message': '索引迁移成功'})
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'迁移失败: {str(e)}'}), 500
+    
     @app.route('/log/create')
     @login_required
     def create_log():
@@ -448,8 +645,8 @@ def register_routes(app):
             today_date = date.today()
             existing_log = Log.query.filter_by(project_id=selected_project.id).filter(Log.date == today_date).first()
         
-        projects = Project.query.filter_by(user_id=current_user.id).order_by(Project.created_at.desc()).all()
-        task_categories = TaskCategory.query.order_by(TaskCategory.order).all()
+        projects = _user_projects()
+        task_categories = _task_categories()
         return render_template('index.html', 
                              projects=projects, 
                              task_categories=task_categories,
@@ -461,8 +658,8 @@ def register_routes(app):
     @login_required
     def logs():
         """日志中心页面"""
-        projects = Project.query.filter_by(user_id=current_user.id).order_by(Project.created_at.desc()).all()
-        task_categories = TaskCategory.query.order_by(TaskCategory.order).all()
+        projects = _user_projects()
+        task_categories = _task_categories()
         return render_template('logs.html', projects=projects, task_categories=task_categories)
     
     @app.route('/projects')
@@ -475,8 +672,7 @@ def register_routes(app):
     @login_required
     def report():
         """周报生成页面"""
-        projects = Project.query.filter_by(user_id=current_user.id).order_by(Project.created_at.desc()).all()
-        return render_template('report.html', projects=projects)
+        return render_template('report.html', projects=_user_projects())
     
     # API路由
     api = Blueprint('api', __name__, url_prefix='/api')
@@ -490,16 +686,14 @@ def register_routes(app):
         
         mac_address = normalize_mac_address(mac_address)
         
-        # 查找设备记录
-        device = UserDevice.query.filter_by(mac_address=mac_address).first()
-        if device:
-            user = User.query.get(device.user_id)
-            if user:
-                return jsonify({
-                    'matched': True,
-                    'user_id': user.id,
-                    'real_name': user.real_name
-                })
+        # 查找设备记录（带缓存）
+        matched = _lookup_user_by_mac(mac_address)
+        if matched:
+            return jsonify({
+                'matched': True,
+                'user_id': matched[0],
+                'real_name': matched[1]
+            })
         
         return jsonify({'matched': False})
     
@@ -507,18 +701,21 @@ def register_routes(app):
     @login_required
     def get_projects():
         """获取当前用户的所有项目"""
-        projects = Project.query.filter_by(user_id=current_user.id).order_by(Project.created_at.desc()).all()
-        projects_list = [p.to_dict() for p in projects]
-        # 应用用户级项目顺序（如果存在）
+        from sqlalchemy import case
+        from sqlalchemy.orm import raiseload
+        # 用户自定义顺序直接翻译成SQL CASE表达式，让数据库按序返回，
+        # 避免序列化后再在Python里整表排序
+        order_clauses = []
         pref = UserPreference.query.filter_by(user_id=current_user.id).first()
         if pref and pref.project_order:
-            try:
-                order_ids = [int(pid) for pid in pref.project_order.split(',') if pid.strip().isdigit()]
-                order_index = {pid: idx for idx, pid in enumerate(order_ids)}
-                projects_list.sort(key=lambda x: order_index.get(x['id'], len(order_index)))
-            except Exception:
-                pass
-        return jsonify(projects_list)
+            order_ids = [int(pid) for pid in pref.project_order.split(',') if pid.strip().isdigit()]
+            if order_ids:
+                order_map = {pid: idx for idx, pid in enumerate(order_ids)}
+                order_clauses.append(case(order_map, value=Project.id, else_=len(order_map)))
+        order_clauses.append(Project.created_at.desc())
+        # to_dict只用到列字段；raiseload确保后续改动不会悄悄引入逐项目的懒加载查询
+        projects = Project.query.options(raiseload('*')).filter_by(user_id=current_user.id).order_by(*order_clauses).all()
+        return _json_response([p.to_dict() for p in projects])
 
     @api.route('/project-order', methods=['GET'])
     @login_required
@@ -537,7 +734,7 @@ def register_routes(app):
         if not isinstance(order_list, list):
             return jsonify({'success': False, 'message': 'order 必须为数组'}), 400
         # 仅保留当前用户的项目ID
-        user_project_ids = {p.id for p in Project.query.filter_by(user_id=current_user.id).all()}
+        user_project_ids = {p.id for p in _user_projects()}
         filtered = [str(pid) for pid in order_list if isinstance(pid, int) and pid in user_project_ids]
         pref = UserPreference.query.filter_by(user_id=current_user.id).first()
         if not pref:
@@ -586,7 +783,7 @@ def register_routes(app):
                             f'addr="{result.get("formatted_address","")}" | {elapsed_ms} ms')
             else:
                 logger.warning(f'[医院定位][未命中] name="{name}", hospital_name="{hospital_name}" | {elapsed_ms} ms')
-            return jsonify({'success': bool(result), 'data': result, 'elapsed_ms': elapsed_ms})
+            return _json_response({'success': bool(result), 'data': result, 'elapsed_ms': elapsed_ms})
         except Exception as e:
             logger = logging.getLogger(__name__)
             logger.exception(f'[医院定位][异常] name="{name}", hospital_name="{hospital_name}"')
@@ -614,8 +811,7 @@ def register_routes(app):
         # 使用外网IP进行定位（get_location_by_ip会自动获取外网IP）
         # 传入None让函数自动获取外网IP，而不是使用客户端IP
         location = get_location_by_ip(None)
-        projects = Project.query.filter_by(user_id=current_user.id).all()
-        projects_dict = [p.to_dict() for p in projects]
+        projects_dict = [p.to_dict() for p in _user_projects()]
         
         matched = match_projects_by_location(location, projects_dict)
         
@@ -631,10 +827,6 @@ def register_routes(app):
         """检查文件扩展名是否允许"""
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
     
-    def allowed_file(filename):
-        """检查文件扩展名是否允许"""
-        return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
-    
     def allowed_template_file(filename):
         """检查模板文件扩展名是否允许"""
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_TEMPLATE_EXTENSIONS
@@ -648,7 +840,9 @@ def register_routes(app):
             ext = file.filename.rsplit('.', 1)[1].lower()
             filename = f"project_{project_id}_{uuid.uuid4().hex[:8]}.{ext}"
             filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            # 分块落盘，常驻内存只占64KB，与上传文件大小无关
+            with open(filepath, 'wb') as dst:
+                shutil.copyfileobj(file.stream, dst, length=64 * 1024)
             # 返回相对路径
             return f"/static/uploads/logos/{filename}"
         return None
@@ -662,7 +856,9 @@ def register_routes(app):
             ext = file.filename.rsplit('.', 1)[1].lower()
             filename = f"project_{project_id}_{uuid.uuid4().hex[:8]}.{ext}"
             filepath = os.path.join(Config.TEMPLATE_UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            # 分块落盘，常驻内存只占64KB，与上传文件大小无关
+            with open(filepath, 'wb') as dst:
+                shutil.copyfileobj(file.stream, dst, length=64 * 1024)
             # 返回绝对路径（用于docxtpl加载）
             return filepath
         return None
@@ -697,8 +893,10 @@ def register_routes(app):
         if not current_user or not current_user.id:
             return jsonify({'success': False, 'message': '用户信息无效，请重新登录'}), 403
         
-        # 检查当前用户是否已有同名项目
-        if Project.query.filter_by(user_id=current_user.id, name=name).first():
+        # 检查当前用户是否已有同名项目（EXISTS只回传布尔值，不取整行）
+        from sqlalchemy import exists
+        if db.session.query(exists().where(
+                Project.user_id == current_user.id).where(Project.name == name)).scalar():
             return jsonify({'success': False, 'message': '项目名称已存在'}), 400
         
         try:
@@ -767,8 +965,10 @@ def register_routes(app):
         if 'name' in data:
             name = (data['name'] or '').strip()
             if name and name != project.name:
-                # 检查新名称是否已存在
-                if Project.query.filter_by(user_id=current_user.id, name=name).first():
+                # 检查新名称是否已存在（EXISTS只回传布尔值，不取整行）
+                from sqlalchemy import exists
+                if db.session.query(exists().where(
+                        Project.user_id == current_user.id).where(Project.name == name)).scalar():
                     return jsonify({'success': False, 'message': '项目名称已存在'}), 400
                 project.name = name
         
@@ -794,11 +994,7 @@ def register_routes(app):
             # 删除旧logo（如果存在）
             if project.hospital_logo:
                 old_logo_path = os.path.join(os.path.dirname(__file__), project.hospital_logo.lstrip('/'))
-                if os.path.exists(old_logo_path):
-                    try:
-                        os.remove(old_logo_path)
-                    except:
-                        pass
+                _remove_file_async(old_logo_path)
             # 保存新logo
             logo_path = save_logo_file(logo_file, project.id)
             if logo_path:
@@ -809,30 +1005,21 @@ def register_routes(app):
             # 检查是否是移除标记
             if isinstance(template_file, str) and template_file == 'removed':
                 # 删除旧模板（如果存在）
-                if project.report_template and os.path.exists(project.report_template):
-                    try:
-                        os.remove(project.report_template)
-                    except:
-                        pass
+                if project.report_template:
+                    _remove_file_async(project.report_template)
                 project.report_template = None
             else:
                 # 删除旧模板（如果存在）
-                if project.report_template and os.path.exists(project.report_template):
-                    try:
-                        os.remove(project.report_template)
-                    except:
-                        pass
+                if project.report_template:
+                    _remove_file_async(project.report_template)
                 # 保存新模板
                 template_path = save_template_file(template_file, project.id)
                 if template_path:
                     project.report_template = template_path
         elif 'report_template' in data and data['report_template'] == 'removed':
             # 处理JSON格式的移除请求
-            if project.report_template and os.path.exists(project.report_template):
-                try:
-                    os.remove(project.report_template)
-                except:
-                    pass
+            if project.report_template:
+                _remove_file_async(project.report_template)
             project.report_template = None
         
         db.session.commit()
@@ -851,13 +1038,19 @@ def register_routes(app):
     @login_required
     def get_project_stats(project_id):
         """获取项目统计信息（日志数量和最新日志日期）"""
-        project = Project.query.filter_by(id=project_id, user_id=current_user.id).first_or_404()
-        
         from sqlalchemy import func
+        # 归属校验和聚合合并为一条查询：项目不存在或非本人时GROUP BY不产生行
         stats = db.session.query(
             func.count(Log.id).label('log_count'),
             func.max(Log.date).label('latest_date')
-        ).filter_by(project_id=project_id).first()
+        ).select_from(Project).outerjoin(
+            Log, Log.project_id == Project.id
+        ).filter(
+            Project.id == project_id, Project.user_id == current_user.id
+        ).group_by(Project.id).first()
+        
+        if stats is None:
+            abort(404)
         
         return jsonify({
             'log_count': stats.log_count or 0,
@@ -868,8 +1061,7 @@ def register_routes(app):
     @login_required
     def get_task_categories():
         """获取所有任务分类"""
-        categories = TaskCategory.query.order_by(TaskCategory.order).all()
-        return jsonify([c.to_dict() for c in categories])
+        return jsonify(_task_categories())
     
     @api.route('/cities', methods=['GET'])
     @login_required
@@ -893,7 +1085,14 @@ def register_routes(app):
                 'data': cities
             })
         else:
-            # 返回所有省份和城市结构
+            # 返回所有省份和城市结构（预序列化字节+ETag，命中时直接304）
+            if _CITIES_JSON is not None:
+                if request.if_none_match and _CITIES_ETAG in request.if_none_match:
+                    return Response(status=304, headers={'ETag': _CITIES_ETAG})
+                return Response(_CITIES_JSON, mimetype='application/json', headers={
+                    'ETag': _CITIES_ETAG,
+                    'Cache-Control': 'public, max-age=3600'
+                })
             return jsonify({
                 'type': 'all',
                 'data': CITIES_DATA
@@ -928,13 +1127,14 @@ def register_routes(app):
             return jsonify({'success': False, 'message': '项目不存在或无权限'}), 403
         
         try:
-            log_date = datetime.strptime(log_date, '%Y-%m-%d').date()
+            log_date = _parse_iso_date(log_date)
         except ValueError:
             return jsonify({'success': False, 'message': '日期格式错误'}), 400
         
-        # 去重：同一项目同一天仅允许一条日志
+        # 预检当日是否已有日志：未跑过索引迁移的库还没有uq_log_project_date约束，
+        # 仅靠IntegrityError兜底会让重复日志静默入库；预检走ix_logs_project_date索引，开销很小
         existed = Log.query.filter_by(project_id=project_id).filter(Log.date == log_date).first()
-        if existed:
+        if existed is not None:
             return jsonify({
                 'success': False,
                 'message': '今日该项目日志已存在，已为您加载。',
@@ -942,10 +1142,10 @@ def register_routes(app):
                 'data': existed.to_dict()
             }), 409
         
-        # 如果没有指定项目状态，使用任务分类作为默认状态
+        # 如果没有指定项目状态，使用任务分类作为默认状态（走进程级缓存，不查库）
         if not project_status:
-            task_category = TaskCategory.query.get(task_category_id)
-            project_status = task_category.name if task_category else None
+            category_names = {c['id']: c['name'] for c in _task_categories()}
+            project_status = category_names.get(task_category_id)
         
         log = Log(
             project_id=project_id,
@@ -961,7 +1161,21 @@ def register_routes(app):
             next_plan=next_plan
         )
         db.session.add(log)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # 唯一约束uq_log_project_date兜底并发去重：两个请求同时通过预检时也只有一条成功
+            db.session.rollback()
+            existed = Log.query.filter_by(project_id=project_id).filter(Log.date == log_date).first()
+            if existed is None:
+                # 不是重复日志引起的约束冲突（如外键非法），按原始错误抛出
+                raise
+            return jsonify({
+                'success': False,
+                'message': '今日该项目日志已存在，已为您加载。',
+                'conflict': True,
+                'data': existed.to_dict()
+            }), 409
         
         return jsonify({'success': True, 'data': log.to_dict()})
     
@@ -969,24 +1183,30 @@ def register_routes(app):
     @login_required
     def update_log(log_id):
         """更新日志"""
-        log = Log.query.get_or_404(log_id)
+        from sqlalchemy.orm import joinedload
+        uid = current_user.id
+        # JOIN预载项目，归属校验不再触发第二条懒加载SELECT
+        log = db.session.query(Log).options(
+            joinedload(Log.project)).filter(Log.id == log_id).first()
+        if log is None:
+            abort(404)
         
         # 验证日志所属项目属于当前用户
-        if log.project.user_id != current_user.id:
+        if log.project.user_id != uid:
             return jsonify({'success': False, 'message': '无权限操作'}), 403
         
         data = request.json
         
         if 'project_id' in data:
             # 验证新项目属于当前用户
-            new_project = Project.query.filter_by(id=data['project_id'], user_id=current_user.id).first()
+            new_project = Project.query.filter_by(id=data['project_id'], user_id=uid).first()
             if not new_project:
                 return jsonify({'success': False, 'message': '项目不存在或无权限'}), 403
             log.project_id = data['project_id']
         
         if 'date' in data:
             try:
-                log.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+                log.date = _parse_iso_date(data['date'])
             except ValueError:
                 return jsonify({'success': False, 'message': '日期格式错误'}), 400
         
@@ -1023,7 +1243,12 @@ def register_routes(app):
     @login_required
     def delete_log(log_id):
         """删除日志"""
-        log = Log.query.get_or_404(log_id)
+        from sqlalchemy.orm import joinedload
+        # JOIN预载项目，归属校验不再触发第二条懒加载SELECT
+        log = db.session.query(Log).options(
+            joinedload(Log.project)).filter(Log.id == log_id).first()
+        if log is None:
+            abort(404)
         
         # 验证日志所属项目属于当前用户
         if log.project.user_id != current_user.id:
@@ -1042,24 +1267,29 @@ def register_routes(app):
         date_str = request.args.get('date')
         search = request.args.get('search', '').strip()
         
-        # 构建查询：先获取当前用户的所有项目ID
-        user_project_ids = [p.id for p in Project.query.filter_by(user_id=current_user.id).all()]
-        
-        if not user_project_ids:
-            return jsonify([])
-        
-        # 基于项目ID查询日志
-        query = Log.query.filter(Log.project_id.in_(user_project_ids))
+        # 单条JOIN查询同时完成归属校验和日志筛选，省去先取项目ID列表的往返；
+        # 只取列并在JOIN中带回项目名/分类名，既跳过ORM对象构建，
+        # 也避免to_dict里逐行懒加载project和task_category
+        query = db.session.query(
+            Log.id, Log.project_id, Project.name.label('project_name'),
+            Log.date, Log.task_category_id,
+            TaskCategory.name.label('task_category_name'),
+            Log.content, Log.project_status,
+            Log.need_product_support, Log.need_dev_support,
+            Log.need_test_support, Log.need_business_support,
+            Log.need_customer_support, Log.next_plan,
+            Log.created_at, Log.updated_at
+        ).join(Project, Log.project_id == Project.id).outerjoin(
+            TaskCategory, Log.task_category_id == TaskCategory.id
+        ).filter(Project.user_id == current_user.id)
         
         if project_id:
-            # 验证项目属于当前用户
-            if project_id not in user_project_ids:
-                return jsonify([])
+            # JOIN已保证只能查到自己项目的日志，直接按项目过滤即可
             query = query.filter(Log.project_id == project_id)
         
         if week_start:
             try:
-                week_start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
+                week_start_date = _parse_iso_date(week_start)
                 week_end_date = week_start_date + timedelta(days=6)
                 query = query.filter(Log.date >= week_start_date, Log.date <= week_end_date)
             except ValueError:
@@ -1067,22 +1297,67 @@ def register_routes(app):
         
         if date_str:
             try:
-                log_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+                log_date = _parse_iso_date(date_str)
                 query = query.filter(Log.date == log_date)
             except ValueError:
                 pass
         
         if search:
-            query = query.filter(Log.content.like(f'%{search}%'))
+            if _fulltext_search_available():
+                # ngram全文索引走索引查找，避免前置通配LIKE的整表扫描
+                query = query.filter(db.text(
+                    "MATCH(logs.content) AGAINST(:ft_search IN NATURAL LANGUAGE MODE)"
+                )).params(ft_search=search)
+            else:
+                query = query.filter(Log.content.like(f'%{search}%'))
         
-        logs = query.order_by(Log.date.desc(), Log.created_at.desc()).all()
+        query = query.order_by(Log.date.desc(), Log.created_at.desc())
         
         # 添加调试日志
         import logging
         logger = logging.getLogger(__name__)
-        logger.info(f'查询日志: project_id={project_id}, week_start={week_start}, 找到 {len(logs)} 条日志')
+        logger.info(f'查询日志: project_id={project_id}, week_start={week_start}')
+        
+        def _row_dict(r):
+            # 与Log.to_dict保持同样的字段和日期格式
+            return {
+                'id': r.id,
+                'project_id': r.project_id,
+                'project_name': r.project_name,
+                'date': r.date.strftime('%Y-%m-%d') if r.date else None,
+                'task_category_id': r.task_category_id,
+                'task_category_name': r.task_category_name,
+                'content': r.content,
+                'project_status': r.project_status,
+                'need_product_support': r.need_product_support,
+                'need_dev_support': r.need_dev_support,
+                'need_test_support': r.need_test_support,
+                'need_business_support': r.need_business_support,
+                'need_customer_support': r.need_customer_support,
+                'next_plan': r.next_plan,
+                'created_at': r.created_at.strftime('%Y-%m-%d %H:%M:%S') if r.created_at else None,
+                'updated_at': r.updated_at.strftime('%Y-%m-%d %H:%M:%S') if r.updated_at else None
+            }
+        
+        if orjson is not None:
+            # 流式输出：按500行一批取数和序列化，大项目列表不再整体驻留内存，
+            # 首字节在查询取完前即可返回
+            from flask import stream_with_context
+            
+            def _stream():
+                yield b'['
+                first = True
+                for row in query.yield_per(500):
+                    if first:
+                        first = False
+                    else:
+                        yield b','
+                    yield orjson.dumps(_row_dict(row))
+                yield b']'
+            
+            return Response(stream_with_context(_stream()), mimetype='application/json')
         
-        return jsonify([log.to_dict() for log in logs])
+        return jsonify([_row_dict(row) for row in query.all()])
     
     @api.route('/weeks', methods=['GET'])
     @login_required
@@ -1100,32 +1375,33 @@ def register_routes(app):
             logger.warning(f'用户 {current_user.id} 尝试访问不属于自己的项目 {project_id}')
             return jsonify([])
         
-        # 获取该项目所有日志的日期
-        logs = Log.query.filter_by(project_id=project_id).order_by(Log.date).all()
+        # 只取去重后的日志日期列（无需完整Log对象，几千条日志也只回传几十个日期）
+        dates = [row[0] for row in db.session.query(Log.date).filter_by(
+            project_id=project_id).distinct().order_by(Log.date).all()]
         
         import logging
         logger = logging.getLogger(__name__)
-        logger.info(f'项目 {project_id} 共有 {len(logs)} 条日志')
+        logger.info(f'项目 {project_id} 共有 {len(dates)} 个日志日期')
         
-        if not logs:
+        if not dates:
             return jsonify([])
         
+        first_date = dates[0]
+        
         # 计算所有周的开始日期
         weeks = set()
-        for log in logs:
+        for log_date in dates:
             # 计算该日期所在周的开始日期（周一）
-            days_since_monday = log.date.weekday()
-            week_start = log.date - timedelta(days=days_since_monday)
+            week_start = log_date - timedelta(days=log_date.weekday())
             weeks.add(week_start)
         
-        weeks = sorted(list(weeks), reverse=True)
+        weeks = sorted(weeks, reverse=True)
         
         # 格式化返回
         result = []
         for week_start in weeks:
             week_end = week_start + timedelta(days=6)
             # 计算是第几周（从项目开始日期算起）
-            first_date = logs[0].date
             days_diff = (week_start - first_date).days
             week_num = (days_diff // 7) + 1
             
@@ -1155,19 +1431,18 @@ def register_routes(app):
             return jsonify([])
         
         try:
-            week_start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
+            week_start_date = _parse_iso_date(week_start)
         except ValueError:
             return jsonify([])
         
         week_end_date = week_start_date + timedelta(days=6)
         
-        # 获取该周有日志的日期
-        logs = Log.query.filter_by(project_id=project_id).filter(
-            Log.date >= week_start_date,
-            Log.date <= week_end_date
-        ).order_by(Log.date).all()
-        
-        dates = sorted(set([log.date for log in logs]), reverse=True)
+        # 去重和排序都交给数据库，只回传日期列（(project_id, date)组合索引可直接覆盖）
+        dates = [row[0] for row in db.session.query(Log.date).filter_by(
+            project_id=project_id
+        ).filter(
+            Log.date.between(week_start_date, week_end_date)
+        ).distinct().order_by(Log.date.desc()).all()]
         
         result = [{
             'date': d.strftime('%Y-%m-%d'),
@@ -1192,7 +1467,7 @@ def register_routes(app):
         project = Project.query.filter_by(id=project_id, user_id=current_user.id).first_or_404()
         
         try:
-            week_start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
+            week_start_date = _parse_iso_date(week_start)
         except ValueError:
             return jsonify({'success': False, 'message': '日期格式错误'}), 400
         
@@ -3,13 +3,21 @@
 """
 应用启动脚本
 """
+import os
+
 from app import create_app
 
 if __name__ == '__main__':
     app = create_app()
+    # FLASK_DEBUG=1 时才用Werkzeug开发服务器（单线程+重载器，仅适合调试）；
+    # 默认用waitress多线程服务，并发吞吐由线程数决定而非串行排队
+    debug = os.environ.get('FLASK_DEBUG') == '1'
     print('=' * 50)
     print('日志记录系统已启动')
     print('访问地址: http://localhost:5000')
     print('=' * 50)
-    app.run(debug=True, host='0.0.0.0', port=5000)
-
+    if debug:
+        app.run(debug=True, host='0.0.0.0', port=5000)
+    else:
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=5000, threads=8)
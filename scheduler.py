@@ -1,18 +1,54 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from models import db, Project, Log, EmailSetting
-from report_generator import generate_weekly_report
+from report_generator import generate_weekly_report, convert_docx_to_pdf
 from email_utils import send_email, build_email_body_by_project
 from flask import Flask
+import os
 
 scheduler = None
+_scheduler_lock_file = None
+# 各邮件设置上次注册任务时的指纹：{setting_id: 字段元组}；
+# 低频刷新任务据此跳过未变化的设置，不反复remove/add
+_email_setting_fingerprints = {}
+
+def _acquire_scheduler_lock():
+    """尝试获取调度器文件锁，保证多worker部署时只有一个进程运行定时任务
+
+    Gunicorn每个worker都会执行create_app()，若不加锁，
+    每个定时任务（含AI周报生成）会在每个worker中重复执行。
+    """
+    global _scheduler_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        # Windows开发环境无fcntl，单进程运行时不需要锁
+        return True
+    lock_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.scheduler.lock')
+    try:
+        lock_file = open(lock_path, 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # 保持文件句柄引用，进程退出时锁自动释放
+        _scheduler_lock_file = lock_file
+        return True
+    except OSError:
+        return False
 
 def init_scheduler(app: Flask):
     """初始化定时任务"""
     global scheduler
     
+    # 允许通过环境变量完全禁用调度器（如专门的调度进程部署方式）
+    if os.environ.get('SCHEDULER_ENABLED', '1') != '1':
+        return
+    
     if scheduler is None:
+        if not _acquire_scheduler_lock():
+            print('定时任务已由其他进程运行，本进程跳过调度器初始化')
+            return
         scheduler = BackgroundScheduler()
         scheduler.start()
         
@@ -25,18 +61,109 @@ def init_scheduler(app: Flask):
             replace_existing=True,
             args=[app]
         )
-        # 改为每分钟检查一次，按用户自定义时间触发
+        # 按每个用户的邮件设置注册精确cron任务，代替每分钟轮询数据库
+        try:
+            with app.app_context():
+                for s in EmailSetting.query.all():
+                    _schedule_email_jobs_for_setting(app, s)
+        except Exception as e:
+            # 首次启动时表可能尚未创建，刷新任务会再注册
+            print(f'加载邮件定时任务失败（将由刷新任务注册）: {e}')
+        # 低频重扫邮件设置：reschedule_email_jobs只在持有调度器的进程内生效，
+        # 多worker部署时设置保存可能落在其他worker，这里兜底同步（最多延迟5分钟）
         scheduler.add_job(
-            func=check_email_dispatch_job,
-            trigger=CronTrigger(minute='*/1'),
-            id='email_dispatch_check',
-            name='检查邮件发送时间（每分钟）',
+            func=refresh_email_jobs_job,
+            trigger=CronTrigger(minute='*/5'),
+            id='email_jobs_refresh',
+            name='同步邮件发送设置',
             replace_existing=True,
             args=[app]
         )
         
         print('定时任务已启动：每周六9:00自动生成周报')
 
+def _parse_hhmm(value, default='07:00'):
+    """解析HH:MM字符串为(时, 分)，格式非法时回退默认值"""
+    try:
+        hour, minute = (value or default).split(':')
+        return int(hour), int(minute)
+    except (ValueError, AttributeError):
+        hour, minute = default.split(':')
+        return int(hour), int(minute)
+
+def _setting_fingerprint(s):
+    """提取影响任务注册的设置字段，用于判断是否需要重建任务"""
+    return (s.qq_email, bool(s.daily_enabled), bool(s.weekly_enabled),
+            s.daily_time, s.weekly_weekday, s.weekly_time)
+
+def _schedule_email_jobs_for_setting(app: Flask, s):
+    """按单个用户的邮件设置注册/更新每日、每周发送任务"""
+    _email_setting_fingerprints[s.id] = _setting_fingerprint(s)
+    daily_id = f'email_daily_{s.id}'
+    weekly_id = f'email_weekly_{s.id}'
+    for job_id in (daily_id, weekly_id):
+        existing = scheduler.get_job(job_id)
+        if existing is not None:
+            existing.remove()
+    if s.daily_enabled and s.qq_email:
+        hour, minute = _parse_hhmm(s.daily_time)
+        scheduler.add_job(
+            func=send_daily_logs_for_setting,
+            trigger=CronTrigger(hour=hour, minute=minute),
+            id=daily_id,
+            name=f'每日日志邮件（用户{s.user_id}）',
+            replace_existing=True,
+            args=[app, s.id]
+        )
+    if s.weekly_enabled and s.qq_email:
+        hour, minute = _parse_hhmm(s.weekly_time)
+        weekday = s.weekly_weekday if s.weekly_weekday is not None else 4
+        scheduler.add_job(
+            func=send_weekly_reports_for_setting,
+            trigger=CronTrigger(day_of_week=weekday, hour=hour, minute=minute),
+            id=weekly_id,
+            name=f'每周周报邮件（用户{s.user_id}）',
+            replace_existing=True,
+            args=[app, s.id]
+        )
+
+def reschedule_email_jobs(app: Flask, s):
+    """邮件设置保存后同步更新对应的定时任务
+
+    仅在持有调度器的进程内立即生效；其他worker处理的保存请求
+    由调度器进程的email_jobs_refresh任务在5分钟内同步。
+    """
+    if scheduler is None:
+        return
+    try:
+        _schedule_email_jobs_for_setting(app, s)
+    except Exception as e:
+        print(f'更新邮件定时任务失败: 用户{s.user_id}: {e}')
+
+def refresh_email_jobs_job(app: Flask):
+    """按数据库中的邮件设置重建发送任务（仅处理有变化的设置）
+
+    设置保存发生在未持有调度器的worker进程时，reschedule_email_jobs
+    是空操作；本任务在调度器进程内定期对账，保证修改最多5分钟内生效。
+    """
+    with app.app_context():
+        try:
+            settings = EmailSetting.query.all()
+            for s in settings:
+                if _email_setting_fingerprints.get(s.id) != _setting_fingerprint(s):
+                    _schedule_email_jobs_for_setting(app, s)
+            # 清理已删除设置遗留的任务和指纹
+            valid_ids = {s.id for s in settings}
+            for sid in list(_email_setting_fingerprints):
+                if sid not in valid_ids:
+                    del _email_setting_fingerprints[sid]
+                    for job_id in (f'email_daily_{sid}', f'email_weekly_{sid}'):
+                        job = scheduler.get_job(job_id)
+                        if job is not None:
+                            job.remove()
+        except Exception as e:
+            print(f'同步邮件定时任务失败: {e}')
+
 def generate_weekly_reports_job(app: Flask):
     """生成周报的定时任务"""
     with app.app_context():
@@ -53,95 +180,91 @@ def generate_weekly_reports_job(app: Flask):
         # 上一周的开始日期（周一）
         last_week_start = last_saturday - timedelta(days=5)
         
-        # 获取所有项目
-        projects = Project.query.all()
+        week_end = last_week_start + timedelta(days=6)
+        
+        # 一次DISTINCT查询找出该周有日志的项目，只加载这些项目的记录，
+        # 既免去逐项目count，也不再整表加载projects
+        active_project_ids = {row[0] for row in db.session.query(Log.project_id).filter(
+            Log.date.between(last_week_start, week_end)
+        ).distinct().all()}
+        
+        if not active_project_ids:
+            return
         
-        for project in projects:
-            try:
-                # 检查该周是否有日志
-                week_end = last_week_start + timedelta(days=6)
-                logs_count = Log.query.filter_by(project_id=project.id).filter(
-                    Log.date >= last_week_start,
-                    Log.date <= week_end
-                ).count()
-                
-                if logs_count > 0:
+        projects = Project.query.filter(Project.id.in_(active_project_ids)).all()
+        
+        def _generate_one(project):
+            # 每个工作线程进入独立的应用上下文（含各自的scoped session）
+            with app.app_context():
+                try:
                     # 生成周报（Word格式）
                     generate_weekly_report(project, last_week_start, 'word')
                     print(f'已为项目 {project.name} 生成周报（{last_week_start} 至 {week_end}）')
-            except Exception as e:
-                print(f'为项目 {project.name} 生成周报时出错: {e}')
+                except Exception as e:
+                    print(f'为项目 {project.name} 生成周报时出错: {e}')
+        
+        if projects:
+            # 周报生成以数据库读取和DOCX写盘为主，跨项目并行
+            with ThreadPoolExecutor(max_workers=min(8, len(projects))) as executor:
+                list(executor.map(_generate_one, projects))
 
-def send_daily_logs_job(app: Flask, now_dt: datetime):
+def send_daily_logs_for_setting(app: Flask, setting_id: int):
+    """按单个用户的设置发送“今日”日志邮件（由精确cron触发）"""
     with app.app_context():
-        # 改为发送“今日”日志
-        target_date = now_dt.date()
-        settings = EmailSetting.query.filter_by(daily_enabled=True).all()
-        for s in settings:
-            try:
-                if not s.qq_email:
-                    continue
-                # 时间匹配（HH:MM）
-                if (s.daily_time or '07:00') != now_dt.strftime('%H:%M'):
-                    continue
-                projects = Project.query.filter_by(user_id=s.user_id).all()
-                pids = [p.id for p in projects]
-                if not pids:
-                    continue
-                logs = Log.query.filter(Log.project_id.in_(pids)).filter(Log.date == target_date).order_by(Log.project_id, Log.created_at).all()
-                body = build_email_body_by_project(logs, projects, header=f'【{target_date}】实施日志')
-                send_email(s.qq_email, f'今日日志-{target_date}', body, attachments=[])
-            except Exception as e:
-                print(f'[定时发送-每日] 用户{s.user_id} 失败: {e}')
+        target_date = datetime.now().date()
+        s = db.session.get(EmailSetting, setting_id)
+        if s is None or not s.daily_enabled or not s.qq_email:
+            return
+        try:
+            # 正文只用到项目的名称和负责人几列，按列查询省去完整ORM对象的构建
+            projects = db.session.query(
+                Project.id, Project.name, Project.hospital_name,
+                Project.project_manager, Project.business_manager,
+                Project.dev_manager
+            ).filter_by(user_id=s.user_id).all()
+            pids = [p.id for p in projects]
+            if not pids:
+                return
+            logs = Log.query.filter(Log.project_id.in_(pids)).filter(Log.date == target_date).order_by(Log.project_id, Log.created_at).all()
+            body = build_email_body_by_project(logs, projects, header=f'【{target_date}】实施日志')
+            send_email(s.qq_email, f'今日日志-{target_date}', body, attachments=[])
+        except Exception as e:
+            print(f'[定时发送-每日] 用户{s.user_id} 失败: {e}')
 
-def send_weekly_reports_email_job(app: Flask, now_dt: datetime):
+def send_weekly_reports_for_setting(app: Flask, setting_id: int):
+    """按单个用户的设置发送上周周报邮件（由精确cron触发）"""
     with app.app_context():
-        today = now_dt.date()
-        # 计算本周的周一（用于生成范围）
-        week_start = today - timedelta(days=today.weekday()+2)  # 提前两天以保证周五时覆盖本周一
-        # 实际使用：上一周周一到周日
+        today = datetime.now().date()
+        # 上一周周一到周日
         last_week_end = today - timedelta(days=today.weekday()+1)
         last_week_start = last_week_end - timedelta(days=6)
-
-        settings = EmailSetting.query.filter_by(weekly_enabled=True).all()
-        for s in settings:
-            try:
-                if not s.qq_email:
-                    continue
-                # 星期与时间匹配
-                weekday = now_dt.weekday()  # 周一=0
-                if (s.weekly_weekday if s.weekly_weekday is not None else 4) != weekday:
-                    continue
-                if (s.weekly_time or '07:00') != now_dt.strftime('%H:%M'):
-                    continue
-                projects = Project.query.filter_by(user_id=s.user_id).all()
-                attachments = []
-                for p in projects:
-                    count = Log.query.filter_by(project_id=p.id).filter(Log.date >= last_week_start, Log.date <= last_week_end).count()
-                    if count == 0:
-                        continue
-                    docx_path = generate_weekly_report(p, last_week_start, 'word')
-                    attachments.append(docx_path)
-                    try:
-                        from docx2pdf import convert
-                        pdf_path = docx_path.replace('.docx', '.pdf')
-                        convert(docx_path, pdf_path)
-                        attachments.append(pdf_path)
-                    except Exception:
-                        pass
-                if not attachments:
+        
+        s = db.session.get(EmailSetting, setting_id)
+        if s is None or not s.weekly_enabled or not s.qq_email:
+            return
+        try:
+            projects = Project.query.filter_by(user_id=s.user_id).all()
+            # 一次分组统计代替逐项目count查询
+            counts = dict(db.session.query(Log.project_id, func.count(Log.id)).filter(
+                Log.project_id.in_([p.id for p in projects]),
+                Log.date.between(last_week_start, last_week_end)
+            ).group_by(Log.project_id).all()) if projects else {}
+            attachments = []
+            for p in projects:
+                if counts.get(p.id, 0) == 0:
                     continue
-                subject = f'周报（{last_week_start} 至 {last_week_end}）'
-                body = '本邮件包含本周周报附件（Word/PDF）。'
-                send_email(s.qq_email, subject, body, attachments=attachments)
-            except Exception as e:
-                print(f'[定时发送-每周] 用户{s.user_id} 失败: {e}')
-
-def check_email_dispatch_job(app: Flask):
-    """每分钟检查是否需要发送每日/每周邮件"""
-    now_dt = datetime.now().replace(second=0, microsecond=0)
-    # 每日
-    send_daily_logs_job(app, now_dt)
-    # 每周
-    send_weekly_reports_email_job(app, now_dt)
+                docx_path = generate_weekly_report(p, last_week_start, 'word')
+                attachments.append(docx_path)
+                try:
+                    # 统一走report_generator的转换器：专用线程+超时，转换卡死不会拖垮整个发送任务
+                    attachments.append(convert_docx_to_pdf(docx_path))
+                except Exception:
+                    pass
+            if not attachments:
+                return
+            subject = f'周报（{last_week_start} 至 {last_week_end}）'
+            body = '本邮件包含本周周报附件（Word/PDF）。'
+            send_email(s.qq_email, subject, body, attachments=attachments)
+        except Exception as e:
+            print(f'[定时发送-每周] 用户{s.user_id} 失败: {e}')
 
@@ -6,56 +6,95 @@
 """
 
 import os
-from dotenv import load_dotenv
-
-# 加载 .env 文件
-env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-if os.path.exists(env_path):
-    load_dotenv(env_path, override=True)
-    print(f"✓ 已加载 .env 文件: {env_path}")
-else:
-    print(f"⚠ .env 文件不存在: {env_path}")
-
-# 检查邮件配置
-from config import Config
-
-print("\n=== 邮件配置检查 ===")
-print(f"MAIL_HOST: {Config.MAIL_HOST}")
-print(f"MAIL_PORT: {Config.MAIL_PORT}")
-print(f"MAIL_USERNAME: {Config.MAIL_USERNAME or '(未设置)'}")
-print(f"MAIL_PASSWORD: {'已设置' if Config.MAIL_PASSWORD else '(未设置)'}")
-print(f"MAIL_USE_SSL: {Config.MAIL_USE_SSL}")
-
-if not Config.MAIL_USERNAME or not Config.MAIL_PASSWORD:
-    print("\n✗ 邮件配置不完整！")
-    print("请在 .env 文件中设置：")
-    print("  MAIL_USERNAME=your_email@qq.com")
-    print("  MAIL_PASSWORD=your_email_password")
-else:
+import smtplib
+import socket
+from contextlib import contextmanager
+
+# 连接超时收紧到3秒：诊断脚本要的是快速失败，
+# 服务器不可达时不必按默认配置干等
+_CONNECT_TIMEOUT = 3
+
+
+@contextmanager
+def smtp_session(host, port, use_ssl):
+    """建立SMTP连接并在退出时关闭；同一连接供后续所有探测复用，
+    不必为每项检查重付TCP+TLS握手"""
+    if use_ssl:
+        server = smtplib.SMTP_SSL(host, port, timeout=_CONNECT_TIMEOUT)
+    else:
+        server = smtplib.SMTP(host, port, timeout=_CONNECT_TIMEOUT)
+        server.starttls()
+    # 打开TCP keepalive，连接复用期间穿越NAT也不会被静默断开
+    server.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    try:
+        yield server
+    finally:
+        try:
+            server.quit()
+        except Exception:
+            pass
+
+
+def main():
+    """执行全部配置检查（dotenv加载、配置导入等副作用都收在这里，
+    import本模块不触发任何初始化）"""
+    from _env import apply as apply_env
+
+    # 加载 .env 文件（解析结果缓存在 _env 模块里，不重复读盘）
+    env_path = apply_env()
+    if os.path.exists(env_path):
+        print(f"✓ 已加载 .env 文件: {env_path}")
+    else:
+        print(f"⚠ .env 文件不存在: {env_path}")
+
+    # 检查邮件配置
+    from config import Config
+
+    # 配置项绑定到局部名，后续每次使用不再重复做类属性查找
+    mail_host = Config.MAIL_HOST
+    mail_port = Config.MAIL_PORT
+    mail_username = Config.MAIL_USERNAME
+    mail_password = Config.MAIL_PASSWORD
+    mail_use_ssl = Config.MAIL_USE_SSL
+
+    print("\n=== 邮件配置检查 ===")
+    print(f"MAIL_HOST: {mail_host}")
+    print(f"MAIL_PORT: {mail_port}")
+    print(f"MAIL_USERNAME: {mail_username or '(未设置)'}")
+    print(f"MAIL_PASSWORD: {'已设置' if mail_password else '(未设置)'}")
+    print(f"MAIL_USE_SSL: {mail_use_ssl}")
+
+    if not mail_username or not mail_password:
+        print("\n✗ 邮件配置不完整！")
+        print("请在 .env 文件中设置：")
+        print("  MAIL_USERNAME=your_email@qq.com")
+        print("  MAIL_PASSWORD=your_email_password")
+        return
+
     print("\n✓ 邮件配置完整")
-    
+
     # 测试连接
     print("\n=== 测试邮件服务器连接 ===")
     try:
-        import smtplib
-        if Config.MAIL_USE_SSL:
-            server = smtplib.SMTP_SSL(Config.MAIL_HOST, Config.MAIL_PORT, timeout=10)
-        else:
-            server = smtplib.SMTP(Config.MAIL_HOST, Config.MAIL_PORT, timeout=10)
-            server.starttls()
-        print(f"✓ 成功连接到 {Config.MAIL_HOST}:{Config.MAIL_PORT}")
-        
-        # 测试登录
-        try:
-            server.login(Config.MAIL_USERNAME, Config.MAIL_PASSWORD)
-            print("✓ 邮件服务器登录成功")
-            server.quit()
-        except smtplib.SMTPAuthenticationError as e:
-            print(f"✗ 邮件服务器登录失败: {e}")
-            print("  请检查 MAIL_USERNAME 和 MAIL_PASSWORD 是否正确")
-        except Exception as e:
-            print(f"✗ 登录时出错: {e}")
+        with smtp_session(mail_host, mail_port, mail_use_ssl) as server:
+            print(f"✓ 成功连接到 {mail_host}:{mail_port}")
+
+            # 测试登录（复用上面的连接）
+            try:
+                server.login(mail_username, mail_password)
+                print("✓ 邮件服务器登录成功")
+                # 登录后的会话健康探测，仍走同一连接
+                server.noop()
+                print("✓ 会话保持正常 (NOOP)")
+            except smtplib.SMTPAuthenticationError as e:
+                print(f"✗ 邮件服务器登录失败: {e}")
+                print("  请检查 MAIL_USERNAME 和 MAIL_PASSWORD 是否正确")
+            except Exception as e:
+                print(f"✗ 登录时出错: {e}")
     except Exception as e:
         print(f"✗ 连接邮件服务器失败: {e}")
         print("  请检查网络连接和邮件服务器配置")
 
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,66 @@ WSGI 入口文件
 """
 
 import os
-from dotenv import load_dotenv
 
-# 在导入 app 之前加载 .env 文件（使用绝对路径和强制覆盖）
-env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-load_dotenv(env_path, override=True)
+# 在导入 app 之前加载 .env 文件（解析结果模块级缓存，重复导入不再重读文件）
+from _env import apply as _apply_env
+_apply_env()
 
-from app import create_app
+_app = None
 
-# 创建应用实例
-app = create_app()
 
-if __name__ == '__main__':
-    app.run(debug=False, host='0.0.0.0', port=5000)
+def get_app():
+    """创建（并记忆）应用实例
+
+    Gunicorn 可按工厂方式启动：gunicorn 'wsgi:get_app()'。
+    把 create_app 的导入也放在这里，单纯 import wsgi 拿配置/工具时
+    不触发整套Flask初始化（数据库引擎、蓝图注册、mapper配置）。
+    """
+    global _app
+    if _app is not None:
+        return _app
+
+    from app import create_app
+    _app = create_app()
+
+    # Gunicorn --preload 下，这里的工作在master进程只执行一次，
+    # 各worker fork后以copy-on-write共享，省掉每个worker的首次导入/编译成本
+    # 1) 提前完成ORM mapper配置（否则各worker的首个查询各付一次）
+    from sqlalchemy.orm import configure_mappers
+    configure_mappers()
+
+    # 2) 预编译页面模板，避免每个worker的首个页面请求触发Jinja编译
+    with _app.app_context():
+        for _tpl in ('base.html', 'index.html', 'login.html', 'register.html',
+                     'logs.html', 'projects.html', 'projects_dashboard.html',
+                     'report.html', 'email_settings.html'):
+            _app.jinja_env.get_template(_tpl)
+
+    # 3) 启动时按pool_size整体预热连接池（同时持有再归还，确保真的建满）；
+    #    配合pool_pre_ping默认关闭，省掉每次checkout的SELECT 1往返，
+    #    过期连接由pool_recycle兜底。预热失败不阻塞启动
+    from models import db
+    with _app.app_context():
+        engine = db.engine
+        try:
+            pool_size = _app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size', 5)
+            warm_conns = [engine.connect() for _ in range(pool_size)]
+            for conn in warm_conns:
+                conn.close()
+        except Exception as e:
+            print(f'⚠ 连接池预热失败（将按需建立连接）: {e}')
 
+    # --preload 下fork出的worker不能复用master里已打开的MySQL套接字，
+    # fork后在子进程丢弃继承的连接池（SQLAlchemy官方推荐做法），按需重建
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+    return _app
+
+
+# 默认保持原有的立即初始化行为（gunicorn wsgi:app 可直接用）；
+# 测试等只想导入本模块的场景设置 WSGI_EAGER=0 跳过
+app = get_app() if os.environ.get('WSGI_EAGER', '1') == '1' else None
+
+if __name__ == '__main__':
+    get_app().run(debug=False, host='0.0.0.0', port=5000)